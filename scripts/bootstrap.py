@@ -4,18 +4,38 @@ AI Protocol Bootstrapper
 
 Usage:
     uv run scripts/bootstrap.py <target_directory> [--agent <name>] [--force]
+                                [--var KEY=VALUE ...] [--vars-file <vars.json>]
 
 Description:
     Injects the AI Protocol from the 'templates/' directory into an existing project.
     Safe by default: will not overwrite existing files unless --force is used.
+    Markdown payload files are rendered while they are copied: each {{KEY}} placeholder
+    with a value from --var / --vars-file is substituted in a single pass. Code and JSON
+    payloads (scripts/context.py, docs/context_registry.json) are copied byte-for-byte.
+    Files are staged and atomically renamed into place under a per-target lock (in the
+    target's .git dir, else a transient dot-file in the target), so overlapping runs
+    against one target never leave torn or half-rendered files.
 """
 
 import argparse
+import contextlib
+import hashlib
+import json
+import re
 import shutil
 import sys
 import os
+import tempfile
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory lock; atomic renames still prevent torn files
+    fcntl = None
+
+# Only these payloads are rendered; {{...}} in code or JSON is literal syntax
+RENDERED_SUFFIXES = (".md",)
+
 def setup_args():
     parser = argparse.ArgumentParser(description="Inject AI Protocol into a project.")
     parser.add_argument("target_dir", help="Target project directory")
@@ -36,6 +56,20 @@ def setup_args():
         "--description",
         help="One-line description to substitute in AGENT_SUBMODULE.md (replaces {{ONE_LINE_DESCRIPTION}})",
     )
+    parser.add_argument(
+        "--var",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="Placeholder value for markdown payload files (replaces {{KEY}}); repeatable",
+    )
+    parser.add_argument(
+        "--vars-file",
+        help=(
+            "JSON object of placeholder values ({\"KEY\": \"VALUE\"}); "
+            "--var entries take precedence"
+        ),
+    )
     return parser.parse_args()
 
 def resolve_roots():
@@ -47,6 +81,154 @@ def resolve_roots():
     templates_root = repo_root / "templates"
     return templates_root
 
+def load_vars_file(vars_path: Path) -> dict[str, str]:
+    """Load a JSON object of placeholder values; exit with clear message on error."""
+    try:
+        with open(vars_path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"❌ Error: Cannot read vars file '{vars_path}': {e}")
+        sys.exit(1)
+    if not isinstance(data, dict):
+        print(f"❌ Error: Vars file '{vars_path}' must contain a JSON object.")
+        sys.exit(1)
+    return {str(k): str(v) for k, v in data.items()}
+
+def parse_var_args(pairs: list[str]) -> dict[str, str]:
+    """Parse repeated KEY=VALUE flags into a mapping; exit on malformed entries."""
+    variables = {}
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        if not sep or not key.strip():
+            print(f"❌ Error: Invalid --var '{pair}' (expected KEY=VALUE).")
+            sys.exit(1)
+        variables[key.strip()] = value
+    return variables
+
+def build_variables(args) -> dict[str, str]:
+    """Merge placeholder values: vars file, then --var flags, then the named submodule flags."""
+    variables = load_vars_file(Path(args.vars_file)) if args.vars_file else {}
+    variables.update(parse_var_args(args.var))
+    if args.module_name:
+        variables["MODULE_NAME"] = args.module_name
+    if args.description:
+        variables["ONE_LINE_DESCRIPTION"] = args.description
+    return variables
+
+def compile_placeholders(variables: dict[str, str]) -> re.Pattern | None:
+    """Compile one alternation pattern matching every {{KEY}} in variables (None if empty)."""
+    if not variables:
+        return None
+    alternation = "|".join(re.escape(k) for k in variables)
+    return re.compile(r"\{\{(" + alternation + r")\}\}")
+
+def render_text(text: str, pattern: re.Pattern, variables: dict[str, str]) -> tuple[str, int]:
+    """Substitute all known placeholders in one pass; return (text, substitution count)."""
+    return pattern.subn(lambda m: variables[m.group(1)], text)
+
+def copy_rendered(
+    src_path: Path, dest_path: Path, pattern: re.Pattern | None, variables: dict[str, str]
+) -> int:
+    """Copy src to dest, rendering placeholders on the way; return substitution count.
+
+    The content is staged in a temp file beside dest and renamed over it, so readers
+    and concurrent runs see the old file or the new one, never a partial write.
+    """
+    rendered, count = None, 0
+    if pattern is not None:
+        with open(src_path, encoding="utf-8", newline="") as f:
+            rendered, count = render_text(f.read(), pattern, variables)
+    fd, tmp = tempfile.mkstemp(dir=dest_path.parent, prefix=f".{dest_path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            if rendered is None:
+                with open(src_path, "rb") as f:
+                    shutil.copyfileobj(f, out)
+            else:
+                out.write(rendered.encode("utf-8"))
+        shutil.copystat(src_path, tmp)
+        os.replace(tmp, dest_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+    return count
+
+LOCK_NAME = "ai_protocol-bootstrap.lock"
+
+def lock_paths(target_root: Path) -> list[tuple[Path, bool]]:
+    """Candidate lock files for a target, best first, each with whether to remove it after.
+
+    The lock lives with the target so every run finds it whatever its TMPDIR: in the
+    target's .git dir when there is one, else as a dot-file in the target that is removed
+    on exit. The temp dir is only the last resort, e.g. for a read-only target.
+    """
+    candidates = []
+    if (target_root / ".git").is_dir():
+        candidates.append((target_root / ".git" / LOCK_NAME, False))
+    candidates.append((target_root / f".{LOCK_NAME}", True))
+    digest = hashlib.sha256(str(target_root).encode("utf-8")).hexdigest()[:16]
+    candidates.append((Path(tempfile.gettempdir()) / f"ai_protocol-bootstrap-{digest}.lock", False))
+    return candidates
+
+def open_lock(path: Path) -> int:
+    """Open a lock file read-only, creating it if needed.
+
+    flock needs no write access, so a lock file created by another user still locks.
+    """
+    try:
+        return os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return os.open(path, os.O_RDONLY | os.O_CREAT, 0o666)
+
+def lock_is_current(fd: int, path: Path) -> bool:
+    """True if fd is still the file at path (a removed lock file no longer excludes anyone)."""
+    try:
+        return os.path.samestat(os.fstat(fd), os.stat(path))
+    except OSError:
+        return False
+
+@contextlib.contextmanager
+def target_lock(target_root: Path):
+    """Hold an exclusive advisory lock on target_root; waits while another run holds it."""
+    if fcntl is None:
+        yield
+        return
+    for path, transient in lock_paths(target_root):
+        try:
+            fd = open_lock(path)
+            break
+        except OSError:
+            continue
+    else:
+        print("⚠️  Warning: Cannot create a lock file; continuing without a lock.")
+        yield
+        return
+    waiting = False
+    try:
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                if not waiting:
+                    print("⏳ Another bootstrap of this target is running; waiting for it...")
+                    waiting = True
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            if not transient or lock_is_current(fd, path):
+                break
+            # The previous holder removed the file we waited on: lock the current one
+            stale, fd = fd, open_lock(path)
+            os.close(stale)
+        try:
+            yield
+        finally:
+            if transient:
+                with contextlib.suppress(OSError):
+                    os.unlink(path)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
 def main():
     args = setup_args()
     templates_root = resolve_roots()
@@ -62,6 +244,9 @@ def main():
          print(f"❌ Error: Templates directory '{templates_root}' not found.")
          sys.exit(1)
 
+    variables = build_variables(args)
+    pattern = compile_placeholders(variables)
+
     print(f"🚀 Bootstrapping AI Protocol into: {target_root}")
     print(f"📂 Source: {templates_root}")
     print(f"🤖 Agent Name: {agent_name}")
@@ -98,44 +283,33 @@ def main():
     created_count = 0
     skipped_count = 0
 
-    for src_rel, dest_rel in payload.items():
-        src_path = templates_root / src_rel
-        dest_path = target_root / dest_rel
+    # Exists-checks and writes happen under the lock, so overlapping runs serialize
+    with target_lock(target_root):
+        for src_rel, dest_rel in payload.items():
+            src_path = templates_root / src_rel
+            dest_path = target_root / dest_rel
 
-        if not src_path.exists():
-            print(f"⚠️  Warning: Source file missing: {src_rel}")
-            continue
+            if not src_path.exists():
+                print(f"⚠️  Warning: Source file missing: {src_rel}")
+                continue
 
-        # Ensure destination directory exists
-        dest_path.parent.mkdir(parents=True, exist_ok=True)
+            # Ensure destination directory exists
+            dest_path.parent.mkdir(parents=True, exist_ok=True)
 
-        if dest_path.exists() and not args.force:
-            print(f"⏭️  Skipped (exists): {dest_rel}")
-            skipped_count += 1
-        else:
-            try:
-                existed = dest_path.exists()
-                shutil.copy2(src_path, dest_path)
-                status = "Overwritten" if existed and args.force else "Created"
-                print(f"✅ {status}: {dest_rel}")
-                created_count += 1
-            except Exception as e:
-                print(f"❌ Failed to copy {src_rel}: {e}")
-
-    # Substitute placeholders in agent file if using monorepo-submodule with flags
-    if args.monorepo_submodule and (args.module_name or args.description):
-        agent_dest = target_root / agent_file_name
-        if agent_dest.exists():
-            try:
-                content = agent_dest.read_text(encoding="utf-8")
-                if args.module_name:
-                    content = content.replace("{{MODULE_NAME}}", args.module_name)
-                if args.description:
-                    content = content.replace("{{ONE_LINE_DESCRIPTION}}", args.description)
-                agent_dest.write_text(content, encoding="utf-8")
-                print(f"✅ Substituted placeholders in {agent_file_name}")
-            except Exception as e:
-                print(f"⚠️  Warning: Failed to substitute placeholders: {e}")
+            if dest_path.exists() and not args.force:
+                print(f"⏭️  Skipped (exists): {dest_rel}")
+                skipped_count += 1
+            else:
+                try:
+                    existed = dest_path.exists()
+                    render = pattern if dest_rel.endswith(RENDERED_SUFFIXES) else None
+                    substituted = copy_rendered(src_path, dest_path, render, variables)
+                    status = "Overwritten" if existed and args.force else "Created"
+                    rendered = f" ({substituted} placeholders rendered)" if substituted else ""
+                    print(f"✅ {status}: {dest_rel}{rendered}")
+                    created_count += 1
+                except Exception as e:
+                    print(f"❌ Failed to copy {src_rel}: {e}")
 
     print("-" * 40)
     print(f"🎉 Bootstrap Complete! ({created_count} created, {skipped_count} skipped)")
@@ -4,16 +4,58 @@ Check protocol version drift between ai-protocol and a target project.
 
 Usage:
     uv run scripts/check_protocol.py [target_directory]
+    uv run scripts/check_protocol.py --scan <root> [--format jsonl|csv] [--workers N]
+    uv run scripts/check_protocol.py --git <repo.git> [--rev <ref> ...] [--all-branches]
+    uv run scripts/check_protocol.py --scan <root> --git [--all-branches]
 
 If target_directory is omitted, uses current working directory.
 Reads ai-protocol VERSION and target's docs/context_registry.json (_meta.protocol_version).
+Each injected protocol file is also hashed against its template and classified as identical,
+customized (differs only inside <!-- CUSTOMIZE --> sections) or stale.
 Reports OK or drift; does not modify any files.
+
+--scan walks <root> (skipping .git, node_modules and .venv), finds every repo carrying
+docs/context_registry.json, reads the versions concurrently and emits one record per repo
+(JSON lines or CSV) to stdout. Exit code 1 if any repo drifted.
+File hashes are cached per (path, mtime, size) in --hash-cache so repeat scans only
+re-hash files that changed.
+
+--git reads the registry and injected files at the given refs straight from the object
+database (bare mirrors need no checkout), streaming blobs through one persistent
+`git cat-file --batch` process per repo. With --scan it discovers bare repos instead.
 """
 
+import argparse
+import csv
+import hashlib
 import json
+import os
+import subprocess
 import sys
+import tempfile
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+PRUNE_DIRS = frozenset({".git", "node_modules", ".venv"})
+SCAN_FIELDS = (
+    "path", "ref", "status", "target_version", "protocol_version", "stale_files", "error"
+)
+FAILING_STATUSES = ("drift", "stale", "error")
+REGISTRY_REL = "docs/context_registry.json"
+
+# Protocol-owned files compared against templates/. PROGRESS.md and context_registry.json
+# become project data after bootstrap, and the agent file's name depends on --agent.
+CONTENT_FILES = (
+    "PROTOCOL.md",
+    "SCRIPTS-CATALOG.md",
+    "docs/CODING_STANDARDS.md",
+    "docs/TESTING.md",
+    "docs/requirements/TEMPLATE.md",
+    "scripts/context.py",
+)
+CUSTOMIZE_MARKER = "<!-- CUSTOMIZE"
+
 
 def get_script_root() -> Path:
     return Path(__file__).resolve().parent.parent
@@ -31,16 +73,608 @@ def read_target_version(target_root: Path) -> str | None:
     if not registry_path.exists():
         return None
     try:
-        with open(registry_path, "r", encoding="utf-8") as f:
+        with open(registry_path, "rb") as f:
+            return parse_registry_version(f.read())
+    except OSError:
+        return None
+
+
+def parse_registry_version(raw: bytes) -> str | None:
+    """Return _meta.protocol_version from registry JSON bytes, or None."""
+    try:
+        data = json.loads(raw)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    if not isinstance(data, dict):
+        return None
+    meta = data.get("_meta")
+    if not isinstance(meta, dict):
+        return None
+    version = meta.get("protocol_version")
+    return version if isinstance(version, str) and version else None
+
+
+class GitBlobReader:
+    """Stream blobs out of a repo's object database via one `git cat-file --batch` pipe.
+
+    Works on bare and non-bare repos alike; nothing is checked out.
+    """
+
+    def __init__(self, git_dir: Path):
+        self.git_dir = git_dir
+        self._proc = subprocess.Popen(
+            ["git", "--git-dir", str(git_dir), "cat-file", "--batch"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def read_many(self, rev: str, paths: list[str]) -> dict[str, tuple[str, bytes] | None]:
+        """Return {path: (blob oid, content) or None} for paths at rev, in one round trip."""
+        request = "".join(f"{rev}:{path}\n" for path in paths).encode("utf-8")
+        self._proc.stdin.write(request)
+        self._proc.stdin.flush()
+        return {path: self._read_object() for path in paths}
+
+    def read(self, rev: str, path: str) -> tuple[str, bytes] | None:
+        return self.read_many(rev, [path])[path]
+
+    def _read_object(self) -> tuple[str, bytes] | None:
+        header = self._proc.stdout.readline().decode("utf-8", errors="replace").split()
+        # "<oid> <type> <size>", or "<spec> missing" / "<spec> ambiguous"
+        if len(header) != 3 or not header[2].isdigit():
+            return None
+        oid, obj_type, size = header[0], header[1], int(header[2])
+        data = self._proc.stdout.read(size)
+        self._proc.stdout.read(1)  # trailing LF
+        return (oid, data) if obj_type == "blob" else None
+
+    def close(self) -> None:
+        if self._proc.stdin:
+            self._proc.stdin.close()
+        self._proc.wait()
+        if self._proc.stdout:
+            self._proc.stdout.close()
+
+    def __enter__(self) -> "GitBlobReader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def is_git_dir(git_dir: Path) -> bool:
+    """True if git accepts git_dir as a repository (bare or a .git directory)."""
+    out = subprocess.run(
+        ["git", "--git-dir", str(git_dir), "rev-parse", "--git-dir"],
+        capture_output=True,
+        text=True,
+    )
+    return out.returncode == 0
+
+
+def verify_ref(git_dir: Path, ref: str) -> bool:
+    """True if ref names a commit in git_dir."""
+    out = subprocess.run(
+        ["git", "--git-dir", str(git_dir), "rev-parse", "--verify", "--quiet", ref + "^{commit}"],
+        capture_output=True,
+        text=True,
+    )
+    return out.returncode == 0
+
+
+def list_branches(git_dir: Path) -> list[str]:
+    """Return the short names of every local branch (refs/heads) in git_dir."""
+    cmd = ["git", "--git-dir", str(git_dir), "for-each-ref", "--format=%(refname:short)"]
+    out = subprocess.run(
+        [*cmd, "refs/heads"],
+        capture_output=True,
+        text=True,
+    )
+    if out.returncode != 0:
+        return []
+    return [line for line in out.stdout.splitlines() if line]
+
+
+def normalize_customized(text: str) -> str:
+    """Drop the bodies of <!-- CUSTOMIZE --> sections, keeping protocol-owned text only.
+
+    A heading carrying the marker opens a region until the next same-or-higher heading;
+    a marker comment line opens one for the rest of the enclosing section.
+    """
+    out = []
+    in_code_block = False
+    section_level, custom_level = 0, None
+    for line in text.splitlines():
+        stripped = line.lstrip()
+        if stripped.startswith("```"):
+            in_code_block = not in_code_block
+        if not in_code_block and stripped.startswith("#"):
+            marks = stripped.split(" ", 1)[0]
+            if marks.strip("#") == "" and " " in stripped:
+                level = len(marks)
+                if custom_level is not None and level <= custom_level:
+                    custom_level = None
+                section_level = level
+                if custom_level is None:
+                    out.append(line.rstrip())
+                    if CUSTOMIZE_MARKER in stripped:
+                        custom_level = level
+                continue
+        if custom_level is not None:
+            continue
+        if not in_code_block and stripped.startswith(CUSTOMIZE_MARKER):
+            # Before any heading, the region runs to the first heading of any level
+            custom_level = section_level or 6
+            continue
+        out.append(line.rstrip())
+    return "\n".join(out)
+
+
+def content_digests(data: bytes, rel_path: str) -> dict[str, str]:
+    """Return raw and customize-normalized sha256 digests of a protocol file."""
+    raw = hashlib.sha256(data).hexdigest()
+    if not rel_path.endswith(".md"):
+        return {"raw": raw, "normalized": raw}
+    text = normalize_customized(data.decode("utf-8", errors="replace"))
+    return {"raw": raw, "normalized": hashlib.sha256(text.encode("utf-8")).hexdigest()}
+
+
+def blob_digests(
+    oid: str, data: bytes, rel_path: str, cache: dict | None = None
+) -> dict[str, str]:
+    """Digest a git blob; blobs are content-addressed, so the cache key is the oid alone."""
+    key = f"blob:{oid}:{rel_path}"
+    if cache is not None and key in cache:
+        return cache[key]["digests"]
+    digests = content_digests(data, rel_path)
+    if cache is not None:
+        cache[key] = {"digests": digests}
+    return digests
+
+
+def file_digests(path: Path, rel_path: str, cache: dict | None = None) -> dict[str, str] | None:
+    """Digest a file, reusing cache entries whose (mtime, size) still match; None if missing."""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    key = str(path)
+    if cache is not None:
+        hit = cache.get(key)
+        if hit and hit["mtime_ns"] == st.st_mtime_ns and hit["size"] == st.st_size:
+            return hit["digests"]
+    try:
+        digests = content_digests(path.read_bytes(), rel_path)
+    except OSError:
+        return None
+    if cache is not None:
+        cache[key] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "digests": digests}
+    return digests
+
+
+def template_digests(templates_root: Path) -> dict[str, dict[str, str]]:
+    """Digest every CONTENT_FILES template that exists."""
+    digests = {}
+    for rel in CONTENT_FILES:
+        d = file_digests(templates_root / rel, rel)
+        if d is not None:
+            digests[rel] = d
+    return digests
+
+
+def classify_content(target: dict[str, str] | None, template: dict[str, str]) -> str:
+    """Return identical, customized, stale or missing for one injected file."""
+    if target is None:
+        return "missing"
+    if target["raw"] == template["raw"]:
+        return "identical"
+    if target["normalized"] == template["normalized"]:
+        return "customized"
+    return "stale"
+
+
+def check_content(
+    target_root: Path, templates: dict[str, dict[str, str]], cache: dict | None = None
+) -> dict[str, str]:
+    """Classify every injected protocol file of target_root against the templates."""
+    return {
+        rel: classify_content(file_digests(target_root / rel, rel, cache), template)
+        for rel, template in templates.items()
+    }
+
+
+class HashCache(dict):
+    """Digest cache for one scan; remembers the keys the scan looked up or stored."""
+
+    def __init__(self, entries: dict | None = None):
+        super().__init__(entries or {})
+        self.used: set[str] = set()
+
+    def get(self, key, default=None):
+        self.used.add(key)
+        return super().get(key, default)
+
+    def __setitem__(self, key, value) -> None:
+        self.used.add(key)
+        super().__setitem__(key, value)
+
+    def live(self) -> dict:
+        """Blob entries plus file entries this scan used; paths it never saw are dropped."""
+        return {k: v for k, v in self.items() if k.startswith("blob:") or k in self.used}
+
+
+def default_hash_cache() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "ai-protocol" / "hash-cache.json"
+
+
+def load_hash_cache(cache_path: Path) -> HashCache:
+    try:
+        with open(cache_path, encoding="utf-8") as f:
             data = json.load(f)
     except (OSError, json.JSONDecodeError):
+        return HashCache()
+    return HashCache(data if isinstance(data, dict) else None)
+
+
+def save_hash_cache(cache_path: Path, cache: dict) -> None:
+    """Write the cache atomically (temp file + rename); failures only cost a re-hash."""
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cache_path.parent, prefix=".hash-cache-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(tmp, cache_path)
+    except OSError as e:
+        print(f"Warning: Could not write hash cache {cache_path}: {e}", file=sys.stderr)
+
+
+def classify_version(protocol_ver: str | None, target_ver: str | None) -> str:
+    """Return ok, drift, unversioned (target has no version) or unknown (no VERSION here)."""
+    if protocol_ver is None:
+        return "unknown"
+    if target_ver is None:
+        return "unversioned"
+    return "ok" if protocol_ver == target_ver else "drift"
+
+
+def find_protocol_repos(scan_root: Path) -> Iterator[Path]:
+    """Yield every directory under scan_root that has docs/context_registry.json.
+
+    Iterative os.scandir walk; PRUNE_DIRS and symlinked directories are never entered.
+    """
+    stack = [os.fspath(scan_root)]
+    while stack:
+        current = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.name in PRUNE_DIRS:
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+        if os.path.isfile(os.path.join(current, "docs", "context_registry.json")):
+            yield Path(current)
+        # Reverse so the depth-first walk pops children in name order
+        stack.extend(sorted(subdirs, reverse=True))
+
+
+def build_record(
+    path: Path,
+    ref: str | None,
+    protocol_ver: str | None,
+    target_ver: str | None,
+    content: dict[str, str],
+) -> dict:
+    """Assemble one scan record; a matching version with stale files reports "stale"."""
+    status = classify_version(protocol_ver, target_ver)
+    stale = sorted(rel for rel, state in content.items() if state == "stale")
+    if status == "ok" and stale:
+        status = "stale"
+    return {
+        "path": str(path),
+        "ref": ref,
+        "status": status,
+        "target_version": target_ver,
+        "protocol_version": protocol_ver,
+        "stale_files": stale,
+    }
+
+
+def error_record(path: Path, ref: str | None, protocol_ver: str | None, message: str) -> dict:
+    """A record for a repo or ref that could not be checked; always counts as a failure."""
+    return {
+        "path": str(path),
+        "ref": ref,
+        "status": "error",
+        "target_version": None,
+        "protocol_version": protocol_ver,
+        "stale_files": [],
+        "error": message,
+    }
+
+
+def scan_repo(
+    target_root: Path,
+    protocol_ver: str | None,
+    templates: dict[str, dict[str, str]],
+    cache: dict | None = None,
+) -> dict:
+    """Build one scan record for a discovered working-tree repo.
+
+    Any unexpected failure becomes an "error" record, so one bad checkout cannot abort
+    a fleet audit.
+    """
+    try:
+        content = check_content(target_root, templates, cache)
+        target_ver = read_target_version(target_root)
+    except Exception as e:
+        return error_record(target_root, None, protocol_ver, f"{type(e).__name__}: {e}")
+    return build_record(target_root, None, protocol_ver, target_ver, content)
+
+
+def check_git_ref(
+    reader: GitBlobReader,
+    ref: str,
+    protocol_ver: str | None,
+    templates: dict[str, dict[str, str]],
+    cache: dict | None = None,
+    require_registry: bool = False,
+) -> dict | None:
+    """Build one record for ref, reading registry and protocol files as blobs.
+
+    With require_registry (fleet scans), a ref without a registry yields None, just as
+    the working-tree scan only reports repos that have one.
+    """
+    blobs = reader.read_many(ref, [REGISTRY_REL, *templates])
+    registry = blobs.pop(REGISTRY_REL)
+    if registry is None and require_registry:
         return None
-    meta = data.get("_meta") or {}
-    return meta.get("protocol_version") or None
+    target_ver = parse_registry_version(registry[1]) if registry else None
+    content = {}
+    for rel, blob in blobs.items():
+        digests = blob_digests(blob[0], blob[1], rel, cache) if blob else None
+        content[rel] = classify_content(digests, templates[rel])
+    return build_record(reader.git_dir, ref, protocol_ver, target_ver, content)
+
+
+def check_git_repo(
+    git_dir: Path,
+    refs: list[str],
+    protocol_ver: str | None,
+    templates: dict[str, dict[str, str]],
+    cache: dict | None = None,
+    require_registry: bool = False,
+) -> list[dict]:
+    """Check every ref of one repo through a single cat-file pipe.
+
+    An empty refs list means every local branch. A path git does not accept as a repo,
+    a repo without branches, or a ref that does not resolve to a commit yields an
+    "error" record instead of a silently passing one.
+    """
+    if not is_git_dir(git_dir):
+        return [error_record(git_dir, None, protocol_ver, "not a git repository")]
+    if refs:
+        bad = [ref for ref in refs if not verify_ref(git_dir, ref)]
+        refs = [ref for ref in refs if ref not in bad]
+    else:
+        bad, refs = [], list_branches(git_dir)
+        if not refs:
+            return [error_record(git_dir, None, protocol_ver, "no local branches")]
+    records = [error_record(git_dir, ref, protocol_ver, "unknown revision") for ref in bad]
+    try:
+        with GitBlobReader(git_dir) as reader:
+            for ref in refs:
+                record = check_git_ref(
+                    reader, ref, protocol_ver, templates, cache, require_registry
+                )
+                if record is not None:
+                    records.append(record)
+    except Exception as e:  # as in scan_repo: report the repo, keep the scan going
+        records.append(error_record(git_dir, None, protocol_ver, f"{type(e).__name__}: {e}"))
+    return records
+
+
+def is_bare_repo(path: str) -> bool:
+    return all(
+        os.path.exists(os.path.join(path, name)) for name in ("HEAD", "objects", "refs")
+    )
+
+
+def find_bare_repos(scan_root: Path) -> Iterator[Path]:
+    """Yield every bare git repo under scan_root (not descending into repos found)."""
+    stack = [os.fspath(scan_root)]
+    while stack:
+        current = stack.pop()
+        if is_bare_repo(current):
+            yield Path(current)
+            continue
+        subdirs = []
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.name in PRUNE_DIRS:
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+        stack.extend(sorted(subdirs, reverse=True))
+
+
+def scan_git(
+    scan_root: Path,
+    refs: list[str],
+    protocol_ver: str | None,
+    workers: int,
+    templates: dict[str, dict[str, str]],
+    cache: dict | None = None,
+) -> Iterator[dict]:
+    """Discover bare repos and check their refs concurrently, one pipe per repo."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for records in pool.map(
+            lambda git_dir: check_git_repo(
+                git_dir, refs, protocol_ver, templates, cache, require_registry=True
+            ),
+            find_bare_repos(scan_root),
+        ):
+            yield from records
+
+
+def scan(
+    scan_root: Path,
+    protocol_ver: str | None,
+    workers: int,
+    templates: dict[str, dict[str, str]] | None = None,
+    cache: dict | None = None,
+) -> Iterator[dict]:
+    """Discover repos and check them concurrently; yields records in walk order."""
+    templates = templates or {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(
+            lambda root: scan_repo(root, protocol_ver, templates, cache),
+            find_protocol_repos(scan_root),
+        )
+
+
+def write_records(records: Iterator[dict], fmt: str, out) -> int:
+    """Stream records as JSON lines or CSV; return the number of failing records.
+
+    Drifted, stale and unreadable ("error") repos all fail.
+    """
+    drifted = 0
+    writer = None
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=SCAN_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+    for record in records:
+        if record["status"] in FAILING_STATUSES:
+            drifted += 1
+        if writer is not None:
+            writer.writerow({**record, "stale_files": ";".join(record["stale_files"])})
+        else:
+            out.write(json.dumps(record) + "\n")
+    return drifted
+
+
+def setup_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Check protocol version drift.")
+    parser.add_argument("target_dir", nargs="?", help="Target project directory (default: cwd)")
+    parser.add_argument("--scan", metavar="ROOT", help="Scan every repo under ROOT")
+    parser.add_argument(
+        "--format", choices=("jsonl", "csv"), default="jsonl", help="Scan output format"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=min(32, (os.cpu_count() or 1) * 4),
+        help="Concurrent registry readers for --scan",
+    )
+    parser.add_argument(
+        "--hash-cache",
+        metavar="PATH",
+        help="File hash cache for --scan (default: $XDG_CACHE_HOME/ai-protocol/hash-cache.json)",
+    )
+    parser.add_argument(
+        "--no-hash-cache", action="store_true", help="Hash every file without a persisted cache"
+    )
+    parser.add_argument(
+        "--git",
+        action="store_true",
+        help="Read from git objects: target (or --scan roots) are git dirs, no checkout needed",
+    )
+    parser.add_argument(
+        "--rev",
+        action="append",
+        default=[],
+        help="Ref to check with --git (repeatable; default HEAD)",
+    )
+    parser.add_argument(
+        "--all-branches", action="store_true", help="With --git, check every local branch"
+    )
+    return parser.parse_args(argv)
+
+
+def run_scan(
+    scan_root: Path,
+    fmt: str,
+    workers: int,
+    cache_path: Path | None,
+    git_refs: list[str] | None = None,
+) -> None:
+    """Scan working trees, or bare repos when git_refs is given ([] = all branches)."""
+    if not scan_root.is_dir():
+        print(
+            f"Error: Scan root does not exist or is not a directory: {scan_root}",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    ai_root = get_script_root()
+    protocol_ver = read_protocol_version(ai_root)
+    templates = template_digests(ai_root / "templates")
+    cache = load_hash_cache(cache_path) if cache_path else None
+    workers = max(1, workers)
+    if git_refs is None:
+        records = scan(scan_root, protocol_ver, workers, templates, cache)
+    else:
+        records = scan_git(scan_root, git_refs, protocol_ver, workers, templates, cache)
+    try:
+        drifted = write_records(records, fmt, sys.stdout)
+    finally:
+        if cache_path:
+            save_hash_cache(cache_path, cache.live())
+    sys.exit(1 if drifted else 0)
+
+
+def report_content(content: dict[str, str]) -> list[str]:
+    """Print non-identical injected files; return the stale ones."""
+    for rel, state in sorted(content.items()):
+        if state != "identical":
+            print(f"  {state}: {rel}")
+    return sorted(rel for rel, state in content.items() if state == "stale")
+
+
+def run_git(git_dir: Path, refs: list[str], fmt: str) -> None:
+    """Check refs of a single git dir and print one record per ref."""
+    if (git_dir / ".git").is_dir():
+        git_dir = git_dir / ".git"
+    if not git_dir.is_dir():
+        print(f"Error: Git directory does not exist: {git_dir}", file=sys.stderr)
+        sys.exit(1)
+    ai_root = get_script_root()
+    protocol_ver = read_protocol_version(ai_root)
+    templates = template_digests(ai_root / "templates")
+    records = check_git_repo(git_dir, refs, protocol_ver, templates)
+    drifted = write_records(iter(records), fmt, sys.stdout)
+    sys.exit(1 if drifted else 0)
 
 
 def main() -> None:
-    target_root = Path(sys.argv[1]).resolve() if len(sys.argv) > 1 else Path.cwd()
+    args = setup_args()
+    # --git: explicit --rev list, [] for every branch
+    git_refs = None
+    if args.git:
+        git_refs = [] if args.all_branches else (args.rev or ["HEAD"])
+    if args.scan:
+        if args.no_hash_cache:
+            cache_path = None
+        else:
+            cache_path = Path(args.hash_cache) if args.hash_cache else default_hash_cache()
+        run_scan(Path(args.scan).resolve(), args.format, args.workers, cache_path, git_refs)
+    if git_refs is not None:
+        git_dir = Path(args.target_dir).resolve() if args.target_dir else Path.cwd()
+        run_git(git_dir, git_refs, args.format)
+    target_root = Path(args.target_dir).resolve() if args.target_dir else Path.cwd()
     ai_root = get_script_root()
 
     if not target_root.exists() or not target_root.is_dir():
@@ -61,11 +695,16 @@ def main() -> None:
         print("Run bootstrap to inject the protocol, or add _meta.protocol_version to the registry.")
         sys.exit(0)
 
+    content = check_content(target_root, template_digests(ai_root / "templates"))
     if protocol_ver == target_ver:
-        print(f"OK: Protocol version match ({protocol_ver}).")
-        sys.exit(0)
-
-    print(f"Drift: ai-protocol is {protocol_ver}, target reports {target_ver}.")
+        if not any(state == "stale" for state in content.values()):
+            print(f"OK: Protocol version match ({protocol_ver}).")
+            report_content(content)
+            sys.exit(0)
+        print(f"Drift: version matches ({protocol_ver}) but injected files are stale:")
+    else:
+        print(f"Drift: ai-protocol is {protocol_ver}, target reports {target_ver}.")
+    report_content(content)
     print(
         "To refresh the target, run: uv run scripts/bootstrap.py <target_dir> --force"
         " (review changes; --force overwrites existing files)."
@@ -2,14 +2,112 @@
 """
 JIT Context Engine: fetch documentation sections by key.
 Resolves paths from repo root. Supports single or multiple files per key.
+Large registries can be sharded into docs/context_registry.d/<prefix>.json (keys
+"<prefix>:..."); a fetch parses only its key's shard and `list` reads a cached key index.
+Each fetch appends a compact usage record to a rotating local log (disable with
+CONTEXT_TELEMETRY=0); `stats` aggregates it into hot-key, byte-cost and latency reports.
+`fetch --compact` minifies prose and tables (code blocks stay byte-exact) to save tokens.
+A line `<!-- include: path/to/file.md#Section -->` (section optional) is replaced at fetch
+time by that content; includes nest, cycles are reported, and each fragment is expanded
+once per invocation and cached across invocations until a file it depends on changes.
+`fetch --rev <commit> <key>` reads the registry and docs as of any commit straight from
+git objects, through one `git cat-file --batch` process shared by every entry.
+`suggest "<task>"` ranks registry keys for a task description (TF-IDF, cosine similarity).
 """
+import datetime
+import gzip
+import hashlib
+import heapq
+import io
 import json
+import math
 import os
+import re
+import shutil
 import subprocess
 import sys
+import tempfile
+import time
+import zlib
+from collections import Counter
+from collections.abc import Iterable, Iterator
 from pathlib import Path
 
+try:  # Optional: vectorized scoring for `suggest`; pure-Python fallback otherwise
+    import numpy as np
+except ImportError:
+    np = None
+
 REGISTRY_FILENAME = "docs/context_registry.json"
+REGISTRY_SHARD_DIR = "docs/context_registry.d"
+KEY_INDEX_FILENAME = "registry_keys.json"
+USAGE_LOG_FILENAME = "usage.log"
+USAGE_LOG_MAX_BYTES = 1024 * 1024
+USAGE_ROTATE_LOCK_MAX_AGE = 60  # seconds before a crashed rotator's lock is broken
+TELEMETRY_ENV = "CONTEXT_TELEMETRY"
+STATS_SORT_FIELDS = ("fetches", "bytes", "p95")
+FETCH_USAGE = (
+    "Usage: context.py fetch [--compact] [--rev <commit>] [--format text|json|ndjson] <key>"
+)
+FETCH_FORMATS = ("text", "json", "ndjson")
+BYTES_PER_TOKEN = 4  # rough estimate for English prose and markdown
+HTML_COMMENT_RE = re.compile(r"<!--.*?-->")
+# Inline comments outside code spans; a code span (group 1) is matched to be kept
+INLINE_COMMENT_RE = re.compile(r"(`+).+?(?<!`)\1(?!`)|<!--.*?-->")
+ATX_HEADING_RE = re.compile(r"^ {0,3}#{1,6}(?:[ \t]|$)")
+INDENTED_CODE_RE = re.compile(r"^(?: {4}|\t)")
+RULE_RE = re.compile(r"^ {0,3}([-*_])( *\1){2,} *$")
+TABLE_CELL_SPLIT_RE = re.compile(r"(?<!\\)\|")
+TABLE_DELIM_CELL_RE = re.compile(r"^:?-+:?$")
+INCLUDE_RE = re.compile(r"^\s*<!--\s*include:\s*([^#]+?)\s*(?:#\s*(.*?)\s*)?-->\s*$")
+INCLUDE_CACHE_FILENAME = "includes.json"
+EMOJI_RE = re.compile(
+    "[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\uFE0F\u200D\u20E3]"
+)
+# Guards for extract_section on pathological docs
+MAX_LINE_LENGTH = 4096
+MAX_SECTION_CHARS = 256 * 1024
+CACHE_DIR_ENV = "CONTEXT_CACHE_DIR"
+SECTION_CACHE_DIRNAME = "sections"
+# Bump when locate_section output or the entry layout changes
+SECTION_CACHE_FORMAT = 1
+SECTION_CACHE_MAX_AGE = 30 * 24 * 3600  # seconds before an unused cache generation is pruned
+SUGGEST_INDEX_FILENAME = "suggest_index.json"
+SUGGEST_TOP_K = 5
+REQUIREMENTS_DIR = "docs/requirements"
+REQUIREMENTS_INDEX_FILENAME = "requirements_index.json"
+CHECKLIST_TITLE = "Implementation Checklist"
+PROGRESS_FILENAME = "docs/PROGRESS.md"
+PROGRESS_ARCHIVE_FILENAME = "docs/PROGRESS.archive.jsonl.gz"
+PROGRESS_INDEX_FILENAME = "progress_index.json"
+PROGRESS_ARCHIVE_SECTIONS = ("active tasks", "completed tasks")
+DONE_ITEM_RE = re.compile(r"^[-*] \[[xX]\] ")
+ENTRY_DATE_RE = re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")
+PROGRESS_USAGE = "Usage: context.py progress {archive|history [term ...]}"
+SCRIPTS_CATALOG_FILENAME = "SCRIPTS-CATALOG.md"
+SCRIPTS_INDEX_FILENAME = "scripts_index.json"
+SCRIPTS_FIELDS = ("script", "category", "description", "usage")
+PREFETCH_DEFAULT_TYPE = "default"
+SIZE_KEY_BUDGET_TOKENS = 4000  # per-key "oversized" threshold unless _meta.budgets sets one
+SIZES_USAGE = "Usage: context.py sizes [--max-key-tokens N] [--max-total-tokens N] [--check]"
+BRANCH_LINE_RE = re.compile(r"^\*\*Branch:\*\*\s*`?([^`\s]+)`?")
+CHECKLIST_ITEM_RE = re.compile(r"^\s*[-*] \[([ xX])\] ")
+USAGE = (
+    "Usage: context.py {list [prefix]|"
+    "fetch [--compact] [--rev <commit>] [--format text|json|ndjson] <key>|"
+    "suggest [-k N] \"<task>\"|"
+    "requirements [--branch <name>]|"
+    "progress {archive|history [term ...]}|"
+    "scripts find <term ...>|"
+    "prefetch [--branch <name>]|"
+    "sizes [--max-key-tokens N] [--max-total-tokens N] [--check]|"
+    "stats [--sort fetches|bytes|p95]}"
+)
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it of on or that the this to was were will"
+    " with you your we our not no do does can must should".split()
+)
 
 
 def get_repo_root(cwd: Path) -> Path:
@@ -48,35 +146,169 @@ def load_registry(registry_path: Path) -> dict:
     return data
 
 
-def extract_section(file_path: Path, header_title: str) -> str:
+def parse_registry_text(text: str, source: str) -> dict:
+    """Parse registry JSON read from somewhere other than a file; exit on error."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        print(f"Error: Invalid JSON in {source}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+class GitBlobReader:
+    """Read files as of one commit through a persistent `git cat-file --batch` process.
+
+    The process is started once and reused for every read (registry, shards, entries,
+    includes); each path is fetched at most once.
+    """
+
+    def __init__(self, repo_root: Path, rev: str):
+        out = subprocess.run(
+            ["git", "rev-parse", "--verify", "--quiet", rev + "^{commit}"],
+            cwd=repo_root,
+            capture_output=True,
+            text=True,
+        )
+        if out.returncode != 0 or not out.stdout.strip():
+            raise ValueError(f"Unknown revision: {rev}")
+        self.rev, self.commit = rev, out.stdout.strip()
+        self._proc = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            cwd=repo_root,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._blobs: dict[str, bytes | None] = {}
+        self._oids: dict[str, str] = {}
+
+    def read_bytes(self, rel: str) -> bytes | None:
+        """Raw content of rel at the commit, or None if absent there."""
+        rel = Path(rel).as_posix()
+        if rel not in self._blobs:
+            self._proc.stdin.write(f"{self.commit}:{rel}\n".encode())
+            self._proc.stdin.flush()
+            header = self._proc.stdout.readline().split()
+            # "<oid> <type> <size>", or "<spec> missing"
+            if len(header) == 3 and header[1] == b"blob" and header[2].isdigit():
+                self._oids[rel] = header[0].decode("ascii")
+                self._blobs[rel] = self._proc.stdout.read(int(header[2]))
+                self._proc.stdout.read(1)  # trailing LF
+            else:
+                if len(header) == 3 and header[2].isdigit():
+                    self._proc.stdout.read(int(header[2]) + 1)  # not a blob (e.g. a tree)
+                self._blobs[rel] = None
+        return self._blobs[rel]
+
+    def blob_id(self, rel: str) -> str | None:
+        """Git object id of rel at the commit, or None if absent there."""
+        self.read_bytes(rel)
+        return self._oids.get(Path(rel).as_posix())
+
+    def read_text(self, rel: str) -> str | None:
+        """Decoded content of rel at the commit, or None if absent there."""
+        data = self.read_bytes(rel)
+        return None if data is None else data.decode("utf-8", errors="replace")
+
+    def close(self) -> None:
+        self._proc.stdin.close()
+        self._proc.wait()
+        self._proc.stdout.close()
+
+
+def load_registry_at_rev(git: GitBlobReader, key: str | None = None) -> dict:
+    """Registry as of git's commit, plus the shard key routes to; exit if missing."""
+    text = git.read_text(REGISTRY_FILENAME)
+    if text is None:
+        print(f"Error: Registry not found at {git.rev}: {REGISTRY_FILENAME}", file=sys.stderr)
+        sys.exit(1)
+    registry = parse_registry_text(text, f"{REGISTRY_FILENAME}@{git.rev}")
+    prefix = shard_prefix(key) if key else None
+    shard_rel = f"{REGISTRY_SHARD_DIR}/{prefix}.json"
+    shard_text = git.read_text(shard_rel) if prefix else None
+    if shard_text is not None:
+        shard = parse_registry_text(shard_text, f"{shard_rel}@{git.rev}")
+        registry = {**registry, **{k: shard[k] for k in shard_keys(shard, prefix)}}
+    return registry
+
+
+def extract_section(
+    file_path: Path, header_title: str, sections: "SectionCache | None" = None
+) -> str:
     """Extract markdown section under header_title (inclusive) until same-or-higher level."""
     if not file_path.exists():
         return f"Error: File not found: {file_path}"
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
+        with open(file_path, "rb") as f:
+            if sections is None:
+                return extract_section_lines(f, header_title)
+            found = sections.locate_file(f, header_title)
     except OSError as e:
         return f"Error reading {file_path}: {e}"
+    return found[3] if found else "Section not found."
+
+
+def extract_section_lines(lines: Iterable[str | bytes], header_title: str) -> str:
+    """Text of the section in lines, or "Section not found."; see locate_section."""
+    found = locate_section(lines, header_title)
+    return found[3] if found else "Section not found."
+
+
+def locate_section(
+    lines: Iterable[str | bytes], header_title: str
+) -> tuple[int, int, int, str] | None:
+    """Scan lines once for the section; cost is bounded on hostile or generated input.
+
+    Returns (level, start, end, text): the heading level, the byte span of the captured
+    lines in the source (end exclusive) and the stripped text; None if absent. Lines may
+    be str or raw bytes (decoded as UTF-8, CRLF normalized); offsets of str lines assume
+    UTF-8. Lines are consumed lazily (a file object is never read whole). Lines longer
+    than MAX_LINE_LENGTH are never treated as headings or fences and are clipped in the
+    output; the captured section stops at MAX_SECTION_CHARS characters.
+    """
     capturing, captured_lines, target_level = False, [], 0
+    captured_chars = 0
     in_code_block = False
     search_title = header_title.lower().strip()
+    offset = start = 0
     for line in lines:
-        stripped = line.lstrip()
-        if stripped.startswith("```"):
-            in_code_block = not in_code_block
-        if not in_code_block and stripped.startswith("#"):
-            parts = stripped.split(" ", 1)
-            if len(parts) >= 2:
-                level, title = len(parts[0]), parts[1].strip().lower()
-                if not capturing and search_title in title:
-                    capturing, target_level = True, level
-                    captured_lines.append(line)
-                    continue
-                if capturing and level <= target_level:
-                    break
+        if isinstance(line, bytes):
+            size = len(line)
+            line = line.decode("utf-8", errors="replace")
+            if line.endswith("\r\n"):
+                line = line[:-2] + "\n"
+        else:
+            size = len(line.encode("utf-8"))
+        if len(line) > MAX_LINE_LENGTH:
+            if capturing:
+                line = line[:MAX_LINE_LENGTH] + " [line truncated]\n"
+        else:
+            stripped = line.lstrip()
+            if stripped.startswith("```"):
+                in_code_block = not in_code_block
+            if not in_code_block and stripped.startswith("#"):
+                parts = stripped.split(" ", 1)
+                marks = parts[0]
+                if len(parts) >= 2 and len(marks) <= 6 and marks == "#" * len(marks):
+                    level, title = len(marks), parts[1].strip().lower()
+                    if not capturing and search_title in title:
+                        capturing, target_level, start = True, level, offset
+                        captured_lines.append(line)
+                        captured_chars += len(line)
+                        offset += size
+                        continue
+                    if capturing and level <= target_level:
+                        break
         if capturing:
+            if captured_chars + len(line) > MAX_SECTION_CHARS:
+                captured_lines.append(f"\n[section truncated at {MAX_SECTION_CHARS} characters]")
+                break
             captured_lines.append(line)
-    return "".join(captured_lines).strip() if captured_lines else "Section not found."
+            captured_chars += len(line)
+        offset += size
+    if not capturing:
+        return None
+    return target_level, start, offset, "".join(captured_lines).strip()
 
 
 def normalize_entries(entry: dict | list | str) -> list[dict]:
@@ -98,56 +330,1602 @@ def normalize_entries(entry: dict | list | str) -> list[dict]:
     return []
 
 
-def fetch_context(key: str, registry: dict, repo_root: Path) -> None:
-    """Print context for key to stdout. Skip _meta and unknown keys."""
-    if key.startswith("_"):
-        print("Key not found.", file=sys.stderr)
-        sys.exit(1)
-    if key not in registry:
-        print("Key not found.", file=sys.stderr)
-        sys.exit(1)
+def blob_id(data: bytes) -> str:
+    """Git blob id of data, as `git hash-object` computes it."""
+    h = hashlib.sha1(b"blob %d\0" % len(data))
+    h.update(data)
+    return h.hexdigest()
+
+
+def file_blob_id(f) -> str | None:
+    """Git blob id (SHA-1 of "blob <size>\\0" + content) of an open binary file.
+
+    Streams the file in chunks; None if it changed size while being read.
+    """
+    size = os.fstat(f.fileno()).st_size
+    h = hashlib.sha1(b"blob %d\0" % size)
+    read = 0
+    for chunk in iter(lambda: f.read(1 << 20), b""):
+        h.update(chunk)
+        read += len(chunk)
+    return h.hexdigest() if read == size else None
+
+
+class SectionCache:
+    """locate_section results keyed by (git blob id, title), shared by all worktrees.
+
+    Entries live under the repository's common git dir, one small JSON file per key,
+    each written to a temp file and renamed into place: readers see a whole entry or
+    none, and concurrent writers of the same key write identical content. An unmodified
+    doc is therefore parsed once for every worktree and every commit that contains it.
+
+    Entries sit under a generation directory named after SECTION_CACHE_FORMAT and the
+    parser limits, so a context.py with a different parser never reads another's results.
+    Each invocation touches its generation; generations unused for SECTION_CACHE_MAX_AGE
+    are removed, which keeps worktrees on different protocol versions from evicting each
+    other while still dropping old parsers' entries.
+    """
+
+    def __init__(self, repo_root: Path):
+        self.base = section_cache_dir(repo_root)
+        self.root = self.base / section_cache_generation()
+        self.parsed = 0  # cache misses this invocation
+        self.prune()
+
+    def prune(self) -> None:
+        """Mark this generation as used and remove generations idle past the max age."""
+        try:
+            os.utime(self.root)
+        except OSError:
+            pass  # created on first store
+        try:
+            generations = list(os.scandir(self.base))
+        except OSError:
+            return
+        cutoff = time.time() - SECTION_CACHE_MAX_AGE
+        for entry in generations:
+            try:
+                stale = entry.name != self.root.name and entry.stat().st_mtime < cutoff
+            except OSError:
+                continue
+            if stale:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def _path(self, oid: str, title: str) -> Path:
+        title_hash = hashlib.sha256(title.lower().strip().encode("utf-8")).hexdigest()[:16]
+        return self.root / oid[:2] / f"{oid[2:]}-{title_hash}.json"
+
+    def lookup(self, oid: str, title: str) -> dict | None:
+        """{"found": locate_section result or None}, or None on a cache miss."""
+        return read_json_cache(self._path(oid, title))
+
+    def store(self, oid: str, title: str, found: tuple | None) -> None:
+        write_json_cache(self._path(oid, title), {"found": found})
+
+    def locate_blob(self, oid: str, data: bytes, title: str) -> tuple | None:
+        """locate_section over blob data, whose id is oid."""
+        return self.locate_many(oid, data, [title])[title]
+
+    def locate_many(self, oid: str, data: bytes, titles: Iterable[str]) -> dict:
+        """{title: locate_section result} for blob data; lines are split at most once.
+
+        Lines end at b"\n" only, as when locate_file reads a file, so a blob and the same
+        file on disk share cache entries without depending on which was parsed first.
+        """
+        results, lines = {}, None
+        for title in titles:
+            hit = self.lookup(oid, title)
+            if hit is not None:
+                results[title] = tuple(hit["found"]) if hit["found"] else None
+                continue
+            if lines is None:
+                lines = list(io.BytesIO(data))
+            results[title] = found = locate_section(lines, title)
+            self.store(oid, title, found)
+            self.parsed += 1
+        return results
+
+    def locate_file(self, f, title: str) -> tuple | None:
+        """locate_section over an open binary file; its content is hashed, not parsed, on a hit."""
+        oid = file_blob_id(f)
+        if oid is not None:
+            hit = self.lookup(oid, title)
+            if hit is not None:
+                return tuple(hit["found"]) if hit["found"] else None
+        f.seek(0)
+        found = locate_section(f, title)
+        self.parsed += 1
+        if oid is not None:
+            self.store(oid, title, found)
+        return found
+
+
+class IncludeResolver:
+    """Expands include directives for one invocation.
+
+    Fragments are nodes (file, section); expansion is a depth-first walk of that graph
+    with the current path kept for cycle detection. Each node is expanded once per
+    resolver (memo) and persisted with the (mtime, size) of every file it depends on.
+    """
+
+    def __init__(
+        self,
+        repo_root: Path,
+        use_cache: bool = True,
+        git: GitBlobReader | None = None,
+        sections: SectionCache | None = None,
+    ):
+        self.repo_root = repo_root
+        self.git = git
+        self.sections = sections
+        # Content at a commit never changes: memo only, no stat-keyed persistent cache
+        use_cache = use_cache and git is None
+        self.memo: dict[tuple[str, str], tuple[str, frozenset[str]]] = {}
+        self.cache_path = get_cache_dir(repo_root) / INCLUDE_CACHE_FILENAME if use_cache else None
+        self._cache: dict | None = None
+        self._dirty = False
+
+    def expand(self, text: str, node: tuple[str, str]) -> str:
+        """Expand includes in text that was read from node."""
+        if "<!--" not in text:
+            return text
+        return self._expand(text, (node,))[0]
+
+    def _expand(self, text: str, stack: tuple) -> tuple[str, frozenset[str]]:
+        out, deps, in_code_block = [], set(), False
+        for line in text.splitlines(keepends=True):
+            if line.lstrip().startswith("```"):
+                in_code_block = not in_code_block
+            match = None if in_code_block else INCLUDE_RE.match(line)
+            if not match:
+                out.append(line)
+                continue
+            included, node_deps = self.resolve((match.group(1), match.group(2) or ""), stack)
+            deps |= node_deps
+            out.append(included + ("\n" if line.endswith("\n") else ""))
+        return "".join(out), frozenset(deps)
+
+    def resolve(self, node: tuple[str, str], stack: tuple = ()) -> tuple[str, frozenset[str]]:
+        """Expanded text of node plus the files it depends on."""
+        if node in stack:
+            chain = " -> ".join(_node_label(n) for n in (*stack, node))
+            return f"Error: include cycle: {chain}", frozenset()
+        if node in self.memo:
+            return self.memo[node]
+        if not self._inside_repo(node[0]):
+            return f"Error: include outside the repository: {node[0]}", frozenset()
+        cached = self._cached(node)
+        if cached is not None:
+            self.memo[node] = cached
+            return cached
+        rel, section = node
+        text, deps = self._expand(self._read(rel, section), (*stack, node))
+        result = (text, deps | {rel})
+        self.memo[node] = result
+        if "Error: include cycle" not in text:
+            self._store(node, result)
+        return result
+
+    def _inside_repo(self, rel: str) -> bool:
+        """False for absolute paths, "../" escapes and symlinks that leave repo_root."""
+        root = self.repo_root.resolve()
+        return (root / rel).resolve().is_relative_to(root)
+
+    def _read(self, rel: str, section: str) -> str:
+        if self.git is not None:
+            text = self.git.read_text(rel)
+            if text is None:
+                return f"Error: File not found at {self.git.rev}: {rel}"
+            if section:
+                if self.sections is not None:
+                    found = self.sections.locate_blob(
+                        self.git.blob_id(rel), self.git.read_bytes(rel), section
+                    )
+                    return found[3] if found else "Section not found."
+                return extract_section_lines(io.BytesIO(self.git.read_bytes(rel)), section)
+            return text.rstrip("\n")
+        file_path = self.repo_root / rel
+        if section:
+            return extract_section(file_path, section, self.sections)
+        try:
+            with open(file_path, encoding="utf-8", errors="replace") as f:
+                return f.read().rstrip("\n")
+        except OSError:
+            return f"Error: File not found: {file_path}"
+
+    def _load_cache(self) -> dict:
+        if self._cache is None:
+            self._cache = (read_json_cache(self.cache_path) or {}) if self.cache_path else {}
+        return self._cache
+
+    def _cached(self, node: tuple[str, str]) -> tuple[str, frozenset[str]] | None:
+        hit = self._load_cache().get(_node_label(node))
+        if not hit or any(_file_stat(self.repo_root / rel) != sig for rel, sig in hit["deps"]):
+            return None
+        return hit["text"], frozenset(rel for rel, _ in hit["deps"])
+
+    def _store(self, node: tuple[str, str], result: tuple[str, frozenset[str]]) -> None:
+        if self.cache_path is None:
+            return
+        text, deps = result
+        self._load_cache()[_node_label(node)] = {
+            "text": text,
+            "deps": [[rel, _file_stat(self.repo_root / rel)] for rel in sorted(deps)],
+        }
+        self._dirty = True
+
+    def save(self) -> None:
+        if self._dirty and self.cache_path is not None:
+            write_json_cache(self.cache_path, self._cache)
+            self._dirty = False
+
+
+def _node_label(node: tuple[str, str]) -> str:
+    return f"{node[0]}#{node[1]}" if node[1] else node[0]
+
+
+def _file_stat(path: Path) -> list | None:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def estimate_tokens(n_bytes: int) -> int:
+    return math.ceil(n_bytes / BYTES_PER_TOKEN)
+
+
+def _compact_table_row(line: str) -> str:
+    """Strip cell padding; delimiter rows shrink to their alignment marks (e.g. :-:)."""
+    body = line.strip()
+    cells = [c.strip() for c in TABLE_CELL_SPLIT_RE.split(body.strip("|"))]
+    if cells and all(TABLE_DELIM_CELL_RE.match(c) for c in cells):
+        cells = [
+            (":" if c.startswith(":") else "") + "-" + (":" if c.endswith(":") else "")
+            for c in cells
+        ]
+    return "|" + "|".join(cells) + "|"
+
+
+def compact_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Single-pass markdown minifier; fenced and indented code pass through byte-exact.
+
+    Drops HTML comments, horizontal rules and emoji in headings, strips table padding
+    and trailing whitespace, and collapses blank-line runs to one blank line. Code spans
+    are left alone, so a `<!--` in prose is text; only a line that starts with "<!--"
+    opens a block comment. A "---" right under a paragraph line is a setext heading
+    underline, not a rule, and is kept.
+    """
+    in_code_block, in_comment, in_indented = False, False, False
+    blank_run, after_text = True, False
+    for line in lines:
+        if in_comment:
+            # A comment swallows everything up to "-->", fences included
+            end = line.find("-->")
+            if end < 0:
+                continue
+            line, in_comment = line[end + 3 :], False
+        stripped = line.lstrip()
+        if in_code_block or stripped.startswith("```"):
+            if stripped.startswith("```"):
+                in_code_block = not in_code_block
+            blank_run, after_text = False, False
+            yield line
+            continue
+        # An indented block starts after a blank line and runs until a line that is
+        # neither blank nor indented; blank lines inside it are kept as they are
+        if not (in_indented and not stripped):
+            in_indented = bool(INDENTED_CODE_RE.match(line)) and (blank_run or in_indented)
+        if in_indented:
+            blank_run, after_text = False, False
+            yield line
+            continue
+        text = line.rstrip("\r\n")
+        if stripped.startswith("<!--") and "-->" not in text:
+            in_comment = True
+            continue
+        text = INLINE_COMMENT_RE.sub(lambda m: m.group(0) if m.group(1) else "", text)
+        text = text.rstrip()
+        if RULE_RE.match(text) and not (after_text and text.lstrip().startswith("-")):
+            continue
+        stripped = text.lstrip()
+        after_text = bool(stripped) and not stripped.startswith(("#", "|"))
+        if ATX_HEADING_RE.match(text):
+            text = " ".join(EMOJI_RE.sub("", text).split())
+        elif stripped.startswith("|"):
+            text = text[: len(text) - len(stripped)] + _compact_table_row(stripped)
+        if not text:
+            if blank_run:
+                continue
+            blank_run = True
+        else:
+            blank_run = False
+        yield text + "\n"
+
+
+def compact_markdown(text: str) -> str:
+    return "".join(compact_lines(text.splitlines(keepends=True))).strip("\n")
+
+
+def key_entries(key: str, registry: dict) -> tuple[list[dict], str | None]:
+    """Normalized entries for key, or ([], error message) for _meta and unknown keys."""
+    if key.startswith("_") or key not in registry:
+        return [], "Key not found."
     entries = normalize_entries(registry[key])
     if not entries:
-        print("Key not found or invalid.", file=sys.stderr)
+        return [], "Key not found or invalid."
+    return entries, None
+
+
+def resolve_entry(
+    entry: dict, repo_root: Path, includes: IncludeResolver, git: GitBlobReader | None = None
+) -> dict:
+    """Resolve one registry entry to a record with includes expanded.
+
+    Keys: file, section, status ("ok", "not_found" for a missing section, "missing_file"
+    or "read_error"), and either error, or level (None for whole files), start and end
+    (byte span in the source file, end exclusive), text and expanded. start and end
+    always describe the source; expanded is true when include expansion made text
+    differ from that span.
+    """
+    rel, section = entry["file"], entry.get("section")
+    record = {"file": rel, "section": section}
+    file_path = repo_root / rel
+    try:
+        if git is not None:
+            data = git.read_bytes(rel)
+            if data is None:
+                return {
+                    **record,
+                    "status": "missing_file",
+                    "error": f"Error: File not found at {git.rev}: {rel}",
+                }
+            if section and includes.sections is not None:
+                found = includes.sections.locate_blob(git.blob_id(rel), data, section)
+            elif section:
+                found = locate_section(io.BytesIO(data), section)
+        elif not file_path.exists():
+            return {
+                **record,
+                "status": "missing_file",
+                "error": f"Error: File not found: {file_path}",
+            }
+        elif section:
+            with open(file_path, "rb") as f:
+                if includes.sections is not None:
+                    found = includes.sections.locate_file(f, section)
+                else:
+                    found = locate_section(f, section)
+        else:
+            data = file_path.read_bytes()
+    except OSError as e:
+        return {**record, "status": "read_error", "error": f"Error reading {file_path}: {e}"}
+    if section:
+        if found is None:
+            return {**record, "status": "not_found", "error": "Section not found."}
+        level, start, end, text = found
+    else:
+        level, start, end = None, 0, len(data)
+        text = data.decode("utf-8", errors="replace").replace("\r\n", "\n")
+    expanded = includes.expand(text, (rel, section or ""))
+    return {
+        **record,
+        "status": "ok",
+        "level": level,
+        "start": start,
+        "end": end,
+        "expanded": expanded != text,
+        "text": expanded,
+    }
+
+
+def fetch_context(
+    key: str,
+    registry: dict,
+    repo_root: Path,
+    compact: bool = False,
+    git: GitBlobReader | None = None,
+) -> dict:
+    """Print context for key to stdout. Skip _meta and unknown keys.
+
+    Files are read from the working tree, or as of git's commit when given.
+    Returns {"bytes", "sections"} (UTF-8 bytes written, entries resolved); with compact,
+    also "raw_bytes", the size before minification.
+    """
+    entries, error = key_entries(key, registry)
+    if error:
+        print(error, file=sys.stderr)
         sys.exit(1)
-    print("--- Context: " + key + " ---")
+    written = raw = 0
+    includes = IncludeResolver(repo_root, git=git, sections=SectionCache(repo_root))
+
+    def emit(text: str, minify: bool = compact) -> None:
+        nonlocal written, raw
+        raw += len(text.encode("utf-8")) + 1
+        if minify:
+            text = compact_markdown(text)
+        print(text)
+        written += len(text.encode("utf-8")) + 1
+
+    at_rev = f" @ {git.rev}" if git is not None else ""
+    emit("--- Context: " + key + at_rev + " ---", minify=False)
     for entry in entries:
-        file_path = repo_root / entry["file"]
-        section = entry.get("section")
-        if section:
-            print(extract_section(file_path, section))
+        record = resolve_entry(entry, repo_root, includes, git)
+        if record["status"] == "ok":
+            emit(record["text"])
+        elif record["section"]:
+            # Section errors are part of the context block; whole-file errors go to stderr
+            emit(record["error"])
+        else:
+            print(record["error"], file=sys.stderr)
+    emit("\n--- End of Context ---", minify=False)
+    includes.save()
+    result = {"bytes": written, "sections": len(entries)}
+    if compact:
+        result["raw_bytes"] = raw
+        saved = raw - written
+        print(
+            f"Compact: {raw} -> {written} bytes (saved {saved}, {saved * 100 // max(raw, 1)}%),"
+            f" ~{estimate_tokens(raw)} -> ~{estimate_tokens(written)} tokens",
+            file=sys.stderr,
+        )
+    return result
+
+
+def stream_records(
+    key: str,
+    registry: dict,
+    repo_root: Path,
+    fmt: str,
+    compact: bool = False,
+    git: GitBlobReader | None = None,
+) -> dict:
+    """Write one JSON record per entry of key to stdout as it is resolved.
+
+    fmt "ndjson" writes one object per line; "json" writes {"key", "rev", "entries": [...]}
+    with the array streamed element by element. Records carry key, file, section, status,
+    level, start, end, expanded, sha256 (of text) and text, or error; an unknown key
+    yields a single error record and exit 1. Returns {"bytes", "sections"} like
+    fetch_context. start and end locate the unexpanded span in the source file; when
+    expanded is true (includes expanded, or --compact changed the text), text and
+    sha256 are of the output, not of that span.
+    """
+    written = 0
+
+    def write(chunk: str) -> None:
+        nonlocal written
+        sys.stdout.write(chunk)
+        sys.stdout.flush()
+        written += len(chunk.encode("utf-8"))
+
+    rev = git.rev if git is not None else None
+    entries, error = key_entries(key, registry)
+    if error:
+        write(json.dumps({"key": key, "rev": rev, "status": "error", "error": error}) + "\n")
+        sys.exit(1)
+    includes = IncludeResolver(repo_root, git=git, sections=SectionCache(repo_root))
+    if fmt == "json":
+        # The envelope minus its closing "]}"; the array is filled as entries resolve
+        write(json.dumps({"key": key, "rev": rev, "entries": []})[:-2] + "\n")
+    for i, entry in enumerate(entries):
+        record = {"key": key, **resolve_entry(entry, repo_root, includes, git)}
+        if "text" in record:
+            if compact:
+                compacted = compact_markdown(record["text"])
+                record["expanded"] = record["expanded"] or compacted != record["text"]
+                record["text"] = compacted
+            record["sha256"] = hashlib.sha256(record["text"].encode("utf-8")).hexdigest()
+            record["text"] = record.pop("text")  # keep the bulky field last
+        line = json.dumps(record, ensure_ascii=False)
+        if fmt == "json":
+            write(("  " if i == 0 else ", ") + line + "\n")
+        else:
+            write(line + "\n")
+    if fmt == "json":
+        write("]}\n")
+    includes.save()
+    return {"bytes": written, "sections": len(entries)}
+
+
+def git_dirs(repo_root: Path) -> tuple[Path, Path] | None:
+    """(git dir, common git dir) of the checkout at repo_root, or None outside git.
+
+    Both are the same `.git` directory in a main checkout. A linked worktree's `.git`
+    file points at its private git dir, whose `commondir` names the shared one. Resolved
+    from the files directly (as `git rev-parse --git-common-dir` would), so no process is
+    spawned.
+    """
+    dot_git = repo_root / ".git"
+    if dot_git.is_dir():
+        return dot_git, dot_git
+    try:
+        text = dot_git.read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+    if not text.startswith("gitdir:"):
+        return None
+    git_dir = (repo_root / text[len("gitdir:"):].strip()).resolve()
+    try:
+        common = (git_dir / (git_dir / "commondir").read_text(encoding="utf-8").strip()).resolve()
+    except OSError:
+        common = git_dir
+    return git_dir, common
+
+
+def get_cache_dir(repo_root: Path) -> Path:
+    """Per-checkout caches: CONTEXT_CACHE_DIR env, else <git dir>/context_cache, else per user."""
+    if os.environ.get(CACHE_DIR_ENV):
+        return Path(os.environ[CACHE_DIR_ENV])
+    dirs = git_dirs(repo_root)
+    if dirs:
+        return dirs[0] / "context_cache"
+    return user_cache_dir(repo_root)
+
+
+_private_dirs: dict[Path, Path] = {}
+
+
+def user_cache_dir(repo_root: Path) -> Path:
+    """Private cache for a checkout without a git dir.
+
+    Cached text goes straight into the agent's context, so it must live where only this
+    user can write: $XDG_CACHE_HOME (or ~/.cache)/ai-protocol/context_cache/<repo hash>,
+    created 0700 and checked for ownership. If that cannot be guaranteed, a throwaway
+    temp dir limits caching to this invocation.
+    """
+    if repo_root in _private_dirs:
+        return _private_dirs[repo_root]
+    digest = hashlib.sha256(str(repo_root).encode("utf-8")).hexdigest()[:16]
+    try:
+        base = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+        cache_dir = base / "ai-protocol" / "context_cache" / digest
+        cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        st = cache_dir.stat()
+        if hasattr(os, "getuid") and st.st_uid != os.getuid():
+            raise PermissionError(f"{cache_dir} is owned by another user")
+        if st.st_mode & 0o077:
+            cache_dir.chmod(0o700)
+    except (OSError, RuntimeError):
+        cache_dir = Path(tempfile.mkdtemp(prefix="context_cache-"))
+    _private_dirs[repo_root] = cache_dir
+    return cache_dir
+
+
+def section_cache_generation() -> str:
+    """Cache generation name, e.g. "v1-3f2a9c0e": format version plus a parser-limits hash."""
+    limits = f"{MAX_LINE_LENGTH}:{MAX_SECTION_CHARS}".encode("ascii")
+    return f"v{SECTION_CACHE_FORMAT}-{hashlib.sha256(limits).hexdigest()[:8]}"
+
+
+def section_cache_dir(repo_root: Path) -> Path:
+    """Content-addressed section cache, shared by every worktree (see SectionCache)."""
+    if os.environ.get(CACHE_DIR_ENV):
+        return Path(os.environ[CACHE_DIR_ENV]) / SECTION_CACHE_DIRNAME
+    dirs = git_dirs(repo_root)
+    if dirs:
+        return dirs[1] / "context_cache" / SECTION_CACHE_DIRNAME
+    return get_cache_dir(repo_root) / SECTION_CACHE_DIRNAME
+
+
+def read_json_cache(cache_path: Path) -> dict | None:
+    """Return a cached JSON object, or None if absent or unreadable."""
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def write_json_cache(cache_path: Path, data: dict) -> None:
+    """Atomically replace a cache file; failures are ignored (the cache is optional)."""
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cache_path.parent, prefix=".tmp-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, cache_path)
+    except OSError:
+        pass
+
+
+def source_fingerprint(registry: dict, repo_root: Path) -> str:
+    """Hash of the registry plus (path, mtime, size) of every file it references."""
+    files = set()
+    for key, value in registry.items():
+        if not key.startswith("_"):
+            files.update(e["file"] for e in normalize_entries(value))
+    stats = []
+    for rel in sorted(files):
+        try:
+            st = (repo_root / rel).stat()
+            stats.append([rel, st.st_mtime_ns, st.st_size])
+        except OSError:
+            stats.append([rel, None, None])
+    payload = json.dumps([registry, stats], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def shard_prefix(key: str) -> str | None:
+    """Shard name a key routes to: its prefix before ':' (None if unsharded)."""
+    prefix, sep, _ = key.partition(":")
+    if not sep or not prefix or "/" in prefix or prefix.startswith("."):
+        return None
+    return prefix
+
+
+def shard_path(repo_root: Path, key: str) -> Path | None:
+    """Shard file a key routes to (by its prefix before ':'), if one exists."""
+    prefix = shard_prefix(key)
+    if prefix is None:
+        return None
+    path = repo_root / REGISTRY_SHARD_DIR / f"{prefix}.json"
+    return path if path.is_file() else None
+
+
+def shard_keys(shard: dict, prefix: str) -> list[str]:
+    """Keys a shard may serve: only those routed to it ("<prefix>:...")."""
+    return [k for k in shard if k.startswith(prefix + ":")]
+
+
+def load_registry_for_key(registry: dict, repo_root: Path, key: str) -> dict:
+    """Main registry plus the one shard key routes to (shard entries take precedence)."""
+    path = shard_path(repo_root, key)
+    if path is None:
+        return registry
+    shard = load_registry(path)
+    merged = dict(registry)
+    merged.update({k: shard[k] for k in shard_keys(shard, path.stem)})
+    return merged
+
+
+def load_full_registry(registry: dict, repo_root: Path) -> dict:
+    """Main registry merged with every shard (for whole-registry commands)."""
+    merged = dict(registry)
+    shard_dir = repo_root / REGISTRY_SHARD_DIR
+    if shard_dir.is_dir():
+        for path in sorted(shard_dir.glob("*.json")):
+            shard = load_registry(path)
+            merged.update({k: shard[k] for k in shard_keys(shard, path.stem)})
+    return merged
+
+
+def list_keys(registry: dict, repo_root: Path) -> list[str]:
+    """Every key, main registry first, then shard keys from the cached key index.
+
+    The index stores each shard's keys with its (mtime, size); only shards whose stat
+    changed are re-parsed, so an unchanged tree lists keys without parsing any shard.
+    """
+    keys = [k for k in registry if not k.startswith("_")]
+    shard_dir = repo_root / REGISTRY_SHARD_DIR
+    if not shard_dir.is_dir():
+        return keys
+    cache_path = get_cache_dir(repo_root) / KEY_INDEX_FILENAME
+    cached = read_json_cache(cache_path) or {}
+    old_shards = cached.get("shards", {}) if cached.get("dir") == str(shard_dir) else {}
+    shards, changed = {}, False
+    with os.scandir(shard_dir) as it:
+        entries = sorted(
+            (e for e in it if e.name.endswith(".json") and e.is_file()), key=lambda e: e.name
+        )
+    for entry in entries:
+        st = entry.stat()
+        stat_sig = [st.st_mtime_ns, st.st_size]
+        prefix = entry.name[: -len(".json")]
+        hit = old_shards.get(prefix)
+        if hit and hit["stat"] == stat_sig:
+            shards[prefix] = hit
+            continue
+        shard = load_registry(Path(entry.path))
+        shards[prefix] = {"stat": stat_sig, "keys": shard_keys(shard, prefix)}
+        changed = True
+    if changed or shards.keys() != old_shards.keys():
+        write_json_cache(cache_path, {"dir": str(shard_dir), "shards": shards})
+    seen = set(keys)
+    for prefix in shards:
+        keys.extend(k for k in shards[prefix]["keys"] if k not in seen)
+    return keys
+
+
+def parse_requirement(lines: list[str]) -> dict:
+    """Branch named by a requirements doc and its Implementation Checklist.
+
+    Returns {"branch", "checklist", "done", "total"}; checklist keeps the item lines and
+    the group headings between them, in order.
+    """
+    branch = None
+    for line in lines:
+        m = BRANCH_LINE_RE.match(line.strip())
+        if m:
+            branch = m.group(1)
+            break
+    found = locate_section(lines, CHECKLIST_TITLE)
+    checklist, done = [], 0
+    for line in found[3].splitlines()[1:] if found else []:
+        m = CHECKLIST_ITEM_RE.match(line)
+        if m:
+            checklist.append(line.rstrip())
+            done += m.group(1) != " "
+        elif line.lstrip().startswith("#"):
+            checklist.append(line.strip())
+    total = sum(1 for line in checklist if CHECKLIST_ITEM_RE.match(line))
+    return {"branch": branch, "checklist": checklist, "done": done, "total": total}
+
+
+def requirements_index(repo_root: Path) -> dict[str, dict]:
+    """{relative path: parse_requirement result} for docs/requirements/*.md, cached.
+
+    Entries are keyed by each file's (mtime, size); only new or changed files are
+    re-read, so a query over hundreds of unchanged docs parses none of them.
+    """
+    req_dir = repo_root / REQUIREMENTS_DIR
+    if not req_dir.is_dir():
+        return {}
+    cache_path = get_cache_dir(repo_root) / REQUIREMENTS_INDEX_FILENAME
+    cached = read_json_cache(cache_path) or {}
+    old_files = cached.get("files", {}) if cached.get("dir") == str(req_dir) else {}
+    files, changed = {}, False
+    with os.scandir(req_dir) as it:
+        entries = sorted(
+            (e for e in it if e.name.endswith(".md") and e.name != "TEMPLATE.md" and e.is_file()),
+            key=lambda e: e.name,
+        )
+    for entry in entries:
+        st = entry.stat()
+        stat_sig = [st.st_mtime_ns, st.st_size]
+        rel = f"{REQUIREMENTS_DIR}/{entry.name}"
+        hit = old_files.get(rel)
+        if hit and hit["stat"] == stat_sig:
+            files[rel] = hit
+            continue
+        try:
+            with open(entry.path, encoding="utf-8", errors="replace") as f:
+                parsed = parse_requirement(f.readlines())
+        except OSError:
+            continue
+        files[rel] = {"stat": stat_sig, **parsed}
+        changed = True
+    if changed or files.keys() != old_files.keys():
+        write_json_cache(cache_path, {"dir": str(req_dir), "files": files})
+    return files
+
+
+def current_branch(repo_root: Path) -> str | None:
+    """Checked-out branch name, or None (detached HEAD, not a git repo, no git)."""
+    try:
+        out = subprocess.run(
+            ["git", "symbolic-ref", "--short", "--quiet", "HEAD"],
+            cwd=repo_root,
+            capture_output=True,
+            text=True,
+        )
+    except FileNotFoundError:
+        return None
+    name = out.stdout.strip()
+    return name if out.returncode == 0 and name else None
+
+
+def find_requirements(index: dict[str, dict], branch: str) -> list[str]:
+    """Docs whose **Branch:** is branch; else docs named after the branch's scope.
+
+    For `feature/20240101-120000-login`, the fallback matches `login.md`.
+    """
+    exact = [rel for rel, doc in index.items() if doc["branch"] == branch]
+    if exact:
+        return exact
+    tail = branch.rsplit("/", 1)[-1]
+    return [rel for rel in index if (stem := Path(rel).stem) == tail or tail.endswith("-" + stem)]
+
+
+def print_requirements(repo_root: Path, branch: str) -> None:
+    """Print the checklist and done/total counts of every doc matching branch."""
+    index = requirements_index(repo_root)
+    matches = find_requirements(index, branch)
+    if not matches:
+        print(f"No requirements file in {REQUIREMENTS_DIR}/ for branch: {branch}", file=sys.stderr)
+        sys.exit(1)
+    for rel in matches:
+        doc = index[rel]
+        print(f"--- Requirements: {branch} ({rel}) ---")
+        if doc["checklist"]:
+            print("\n".join(doc["checklist"]))
         else:
-            if not file_path.exists():
-                print(f"Error: File not found: {file_path}", file=sys.stderr)
+            print(f"No {CHECKLIST_TITLE} items.")
+        print(f"Done: {doc['done']}/{doc['total']} ({doc['total'] - doc['done']} open)")
+
+
+def _table_cells(line: str) -> list[str]:
+    cells = TABLE_CELL_SPLIT_RE.split(line.strip().strip("|"))
+    return [c.strip().replace("\\|", "|") for c in cells]
+
+
+def parse_catalog(lines: Iterable[str]) -> list[dict]:
+    """Rows of every table with a Script column, as {script, category, description, usage}.
+
+    The category is the enclosing `##` heading without its path and comments, e.g.
+    "Utilities" for "## Utilities (`scripts/utils/`) <!-- CUSTOMIZE -->". Placeholder
+    rows (an italic Script cell such as *No scripts yet*) are skipped.
+    """
+    rows, category, columns, in_code_block = [], "", None, False
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            in_code_block = not in_code_block
+        if in_code_block:
+            continue
+        if not stripped.startswith("|"):
+            columns = None  # a table ends at its first non-row line
+            if stripped.startswith("## "):
+                title = HTML_COMMENT_RE.sub("", stripped[3:])
+                category = re.sub(r"\(`[^`]*`\)", "", title).strip()
+            continue
+        cells = _table_cells(stripped)
+        if columns is None:
+            columns = [c.lower() for c in cells]
+            continue
+        if "script" not in columns or all(TABLE_DELIM_CELL_RE.match(c) for c in cells if c):
+            continue
+        row = dict(zip(columns, cells))
+        script = row.get("script", "")
+        if not script or (script.startswith("*") and script.endswith("*")):
+            continue
+        rows.append(
+            {
+                "script": script.strip("`"),
+                "category": category,
+                "description": row.get("description", ""),
+                "usage": row.get("usage", ""),
+            }
+        )
+    return rows
+
+
+def scripts_index(repo_root: Path) -> list[dict]:
+    """Parsed catalog rows, re-parsed only when SCRIPTS-CATALOG.md's (mtime, size) changes."""
+    catalog_path = repo_root / SCRIPTS_CATALOG_FILENAME
+    try:
+        st = catalog_path.stat()
+    except OSError:
+        print(f"Error: {SCRIPTS_CATALOG_FILENAME} not found.", file=sys.stderr)
+        sys.exit(1)
+    stat_sig = [st.st_mtime_ns, st.st_size]
+    cache_path = get_cache_dir(repo_root) / SCRIPTS_INDEX_FILENAME
+    cached = read_json_cache(cache_path)
+    if cached and cached.get("path") == str(catalog_path) and cached.get("stat") == stat_sig:
+        return cached["rows"]
+    with open(catalog_path, encoding="utf-8", errors="replace") as f:
+        rows = parse_catalog(f)
+    write_json_cache(cache_path, {"path": str(catalog_path), "stat": stat_sig, "rows": rows})
+    return rows
+
+
+def find_scripts(rows: list[dict], query: str) -> list[dict]:
+    """Rows containing every whitespace-separated term of query (case-insensitive)."""
+    terms = query.lower().split()
+    return [
+        row
+        for row in rows
+        if all(t in " ".join(row[f] for f in SCRIPTS_FIELDS).lower() for t in terms)
+    ]
+
+
+def print_scripts(rows: list[dict]) -> None:
+    """Markdown table of catalog rows."""
+    print("| Script | Category | Description | Usage |")
+    print("|--------|----------|-------------|-------|")
+    for row in rows:
+        cells = [f"`{row['script']}`"] + [row[f] for f in SCRIPTS_FIELDS[1:]]
+        print("| " + " | ".join(c.replace("|", "\\|") for c in cells) + " |")
+
+
+def prefetch_keys(registry: dict, branch: str) -> tuple[str, list[str]]:
+    """(branch type, keys to warm) from _meta.prefetch, e.g. {"feature": [...], ...}.
+
+    The type is the part of `<branch-type>/yyyymmdd-hhmmss-<name>` before the slash;
+    types without an entry, and unprefixed branches, use the "default" entry if any.
+    """
+    sets = registry.get("_meta", {}).get("prefetch", {})
+    branch_type = branch.split("/", 1)[0] if "/" in branch else PREFETCH_DEFAULT_TYPE
+    keys = sets.get(branch_type)
+    if keys is None:
+        keys = sets.get(PREFETCH_DEFAULT_TYPE, [])
+    return branch_type, list(keys)
+
+
+def prefetch(registry: dict, repo_root: Path, keys: list[str]) -> dict:
+    """Warm the section, include and requirements caches for keys in one batched pass.
+
+    Entries of all keys are grouped by file; each file is read and hashed once and all
+    of its sections are located in that pass. Returns counts for the summary line.
+    """
+    wanted: dict[str, set[str]] = {}
+    found_keys = []
+    for key in keys:
+        entries, error = key_entries(key, load_registry_for_key(registry, repo_root, key))
+        if error:
+            print(f"Warning: prefetch key not found: {key}", file=sys.stderr)
+            continue
+        found_keys.append(key)
+        for e in entries:
+            wanted.setdefault(e["file"], set()).add(e.get("section") or "")
+    sections = SectionCache(repo_root)
+    includes = IncludeResolver(repo_root, sections=sections)
+    for rel, titles in wanted.items():
+        try:
+            data = (repo_root / rel).read_bytes()
+        except OSError:
+            print(f"Warning: prefetch file not found: {rel}", file=sys.stderr)
+            continue
+        found = sections.locate_many(blob_id(data), data, sorted(t for t in titles if t))
+        for title in titles:
+            if not title:
+                includes.expand(data.decode("utf-8", errors="replace"), (rel, ""))
+            elif found[title]:
+                includes.expand(found[title][3], (rel, title))
+    includes.save()
+    requirements_index(repo_root)
+    return {
+        "keys": len(found_keys),
+        "files": len(wanted),
+        "sections": sum(len(t) for t in wanted.values()),
+        "parsed": sections.parsed,
+    }
+
+
+def key_sizes(registry: dict, repo_root: Path) -> tuple[list[dict], list[dict]]:
+    """Resolve every key as fetch would (includes expanded) and measure it.
+
+    Returns (rows, overlaps). Each row is {"key", "entries", "missing", "lines", "bytes",
+    "tokens"}; each overlap {"file", "keys": [a, b], "bytes"} is a pair of entries whose
+    byte spans in one source file intersect (a whole file overlaps all its sections).
+    """
+    includes = IncludeResolver(repo_root, sections=SectionCache(repo_root))
+    rows, spans = [], {}
+    for key, value in registry.items():
+        if key.startswith("_"):
+            continue
+        row = {"key": key, "entries": 0, "missing": 0, "lines": 0, "bytes": 0}
+        for entry in normalize_entries(value):
+            record = resolve_entry(entry, repo_root, includes)
+            row["entries"] += 1
+            if record["status"] != "ok":
+                row["missing"] += 1
                 continue
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    print(f.read())
-            except OSError as e:
-                print(f"Error reading {file_path}: {e}", file=sys.stderr)
-    print("\n--- End of Context ---")
+            row["bytes"] += len(record["text"].encode("utf-8"))
+            row["lines"] += record["text"].count("\n") + 1
+            spans.setdefault(record["file"], []).append((record["start"], record["end"], key))
+        row["tokens"] = estimate_tokens(row["bytes"])
+        rows.append(row)
+    includes.save()
+    overlaps = []
+    for rel, file_spans in spans.items():
+        file_spans.sort()
+        for i, (start, end, key) in enumerate(file_spans):
+            for other_start, other_end, other in file_spans[i + 1 :]:
+                if other_start >= end:
+                    break  # sorted by start: no later span reaches back into this one
+                overlaps.append(
+                    {"file": rel, "keys": [key, other], "bytes": min(end, other_end) - other_start}
+                )
+    return rows, overlaps
+
+
+def parse_sizes_args(args: list[str], registry: dict) -> dict | None:
+    """{key_tokens, total_tokens, check}: flags override _meta.budgets; None when malformed."""
+    budgets = registry.get("_meta", {}).get("budgets", {})
+    opts = {
+        "key_tokens": budgets.get("key_tokens", SIZE_KEY_BUDGET_TOKENS),
+        "total_tokens": budgets.get("total_tokens"),
+        "check": False,
+    }
+    flags = {"--max-key-tokens": "key_tokens", "--max-total-tokens": "total_tokens"}
+    i = 0
+    while i < len(args):
+        if args[i] == "--check":
+            opts["check"] = True
+        elif args[i] in flags and i + 1 < len(args) and args[i + 1].isdigit():
+            opts[flags[args[i]]] = int(args[i + 1])
+            i += 1
+        else:
+            return None
+        i += 1
+    return opts
+
+
+def print_sizes(
+    rows: list[dict], overlaps: list[dict], key_budget: int, total_budget: int | None
+) -> list[str]:
+    """Print the cost report (largest keys first); return the budget violations."""
+    violations = []
+    rows = sorted(rows, key=lambda r: (-r["tokens"], r["key"]))
+    width = max(len("key"), *(len(r["key"]) for r in rows)) if rows else len("key")
+    print(f"{'key':<{width}}  {'entries':>7}  {'lines':>7}  {'bytes':>9}  {'~tokens':>8}")
+    for r in rows:
+        notes = []
+        if r["tokens"] > key_budget:
+            notes.append(f"OVERSIZED (> {key_budget} tokens)")
+            violations.append(f"{r['key']}: ~{r['tokens']} tokens > {key_budget}")
+        if r["missing"]:
+            notes.append(f"{r['missing']} missing")
+        print(
+            f"{r['key']:<{width}}  {r['entries']:>7}  {r['lines']:>7}  {r['bytes']:>9}"
+            f"  {r['tokens']:>8}" + ("  " + "; ".join(notes) if notes else "")
+        )
+    total_bytes = sum(r["bytes"] for r in rows)
+    total_tokens = sum(r["tokens"] for r in rows)
+    budget_note = f" (budget {total_budget})" if total_budget is not None else ""
+    print(
+        f"\nTotal: {len(rows)} keys, {sum(r['lines'] for r in rows)} lines, {total_bytes} bytes,"
+        f" ~{total_tokens} tokens{budget_note}"
+    )
+    if total_budget is not None and total_tokens > total_budget:
+        violations.append(f"total: ~{total_tokens} tokens > {total_budget}")
+    if overlaps:
+        print("\nOverlaps (the same source bytes fetched by more than one entry):")
+        for o in overlaps:
+            print(f"  {o['keys'][0]} / {o['keys'][1]} in {o['file']}: {o['bytes']} bytes")
+    return violations
+
+
+def record_usage(repo_root: Path, record: dict) -> None:
+    """Append one JSON line to the usage log; never raises and never blocks a fetch.
+
+    The log rotates to usage.log.1 past USAGE_LOG_MAX_BYTES (see rotate_usage_log).
+    Each record is a single O_APPEND write, so concurrent agents do not interleave lines.
+    """
+    if os.environ.get(TELEMETRY_ENV, "1") == "0":
+        return
+    try:
+        log_path = get_cache_dir(repo_root) / USAGE_LOG_FILENAME
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if log_path.stat().st_size > USAGE_LOG_MAX_BYTES:
+                rotate_usage_log(log_path)
+        except FileNotFoundError:
+            pass
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+        fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def rotate_usage_log(log_path: Path) -> None:
+    """Move an oversized log to usage.log.1, one process at a time.
+
+    The rotator holds an O_EXCL lock file and re-checks the size under it, so two
+    processes that both saw a full log cannot rotate twice and overwrite usage.log.1
+    with a near-empty log. A process that finds the lock taken skips rotation; a later
+    write retries. A lock older than USAGE_ROTATE_LOCK_MAX_AGE is left by a crash and
+    is broken.
+    """
+    lock_path = log_path.with_name(USAGE_LOG_FILENAME + ".rotating")
+    try:
+        fd = os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        try:
+            if time.time() - lock_path.stat().st_mtime > USAGE_ROTATE_LOCK_MAX_AGE:
+                lock_path.unlink()
+        except OSError:
+            pass
+        return
+    try:
+        if log_path.stat().st_size > USAGE_LOG_MAX_BYTES:
+            os.replace(log_path, log_path.with_name(USAGE_LOG_FILENAME + ".1"))
+    finally:
+        os.close(fd)
+        lock_path.unlink()
+
+
+def read_usage(repo_root: Path) -> list[dict]:
+    """Usage records from the rotated and current logs, oldest first."""
+    log_path = get_cache_dir(repo_root) / USAGE_LOG_FILENAME
+    records = []
+    for path in (log_path.with_name(USAGE_LOG_FILENAME + ".1"), log_path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+        except OSError:
+            continue
+    return records
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of values (0.0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def usage_stats(records: list[dict]) -> list[dict]:
+    """Per-key fetch count, byte cost and latency percentiles."""
+    by_key: dict[str, list[dict]] = {}
+    for r in records:
+        if isinstance(r, dict) and "key" in r:
+            by_key.setdefault(r["key"], []).append(r)
+    rows = []
+    for key, items in by_key.items():
+        total = sum(r.get("bytes", 0) for r in items)
+        latencies = [r.get("ms", 0.0) for r in items]
+        rows.append(
+            {
+                "key": key,
+                "fetches": len(items),
+                "bytes": total,
+                "avg_bytes": total // len(items),
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+            }
+        )
+    return rows
+
+
+def print_stats(records: list[dict], sort_by: str = "fetches") -> None:
+    """Print the per-key report (hottest first by default) and overall latency."""
+    rows = usage_stats(records)
+    if not rows:
+        print("No usage recorded yet.")
+        return
+    rows.sort(key=lambda r: (-r[sort_by], r["key"]))
+    width = max(len("key"), *(len(r["key"]) for r in rows))
+    header = ("fetches", "bytes", "avg", "p50 ms", "p95 ms")
+    print(
+        f"{'key':<{width}}  {header[0]:>7}  {header[1]:>10}  {header[2]:>8}"
+        f"  {header[3]:>7}  {header[4]:>7}"
+    )
+    for r in rows:
+        print(
+            f"{r['key']:<{width}}  {r['fetches']:>7}  {r['bytes']:>10}  {r['avg_bytes']:>8}"
+            f"  {r['p50']:>7.1f}  {r['p95']:>7.1f}"
+        )
+    latencies = [r.get("ms", 0.0) for r in records if isinstance(r, dict) and "key" in r]
+    total_bytes = sum(r["bytes"] for r in rows)
+    print(
+        f"\nTotal: {len(latencies)} fetches, {total_bytes} bytes across {len(rows)} keys;"
+        f" latency p50 {percentile(latencies, 50):.1f} ms, p95 {percentile(latencies, 95):.1f} ms"
+    )
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def registry_texts(registry: dict, repo_root: Path) -> dict[str, str]:
+    """Resolved text of every key; each referenced file is read once (see prefetch)."""
+    wanted: dict[str, set[str]] = {}
+    for key, value in registry.items():
+        if not key.startswith("_"):
+            for e in normalize_entries(value):
+                wanted.setdefault(e["file"], set()).add(e.get("section") or "")
+    sections = SectionCache(repo_root)
+    resolved: dict[tuple[str, str], str] = {}
+    for rel, titles in wanted.items():
+        try:
+            data = (repo_root / rel).read_bytes()
+        except OSError:
+            continue
+        if "" in titles:
+            resolved[(rel, "")] = data.decode("utf-8", errors="replace").replace("\r\n", "\n")
+        found = sections.locate_many(blob_id(data), data, sorted(t for t in titles if t))
+        for title, hit in found.items():
+            if hit:
+                resolved[(rel, title)] = hit[3]
+    return {
+        key: " ".join(
+            resolved.get((e["file"], e.get("section") or ""), "")
+            for e in normalize_entries(value)
+        )
+        for key, value in registry.items()
+        if not key.startswith("_")
+    }
+
+
+def build_suggest_index(registry: dict, repo_root: Path) -> dict:
+    """TF-IDF postings over every key: {keys, idf, postings{term: [doc ids, weights]}}.
+
+    Document vectors use sublinear tf and are L2-normalized, so a query's dot product
+    with them is its cosine similarity. Key names count as part of their document.
+    Postings are stored as space-separated strings and only parsed for query terms.
+    """
+    keys, doc_terms = [], []
+    for key, text in registry_texts(registry, repo_root).items():
+        keys.append(key)
+        key_words = key.replace(":", " ") + " "
+        doc_terms.append(Counter(tokenize(key_words * 2 + text)))
+    n_docs = len(keys)
+    df = Counter(term for counts in doc_terms for term in counts)
+    idf = {term: math.log((1 + n_docs) / (1 + n)) + 1.0 for term, n in df.items()}
+    postings: dict[str, tuple[list[str], list[str]]] = {}
+    for doc_id, counts in enumerate(doc_terms):
+        weights = {t: (1.0 + math.log(c)) * idf[t] for t, c in counts.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        for term, w in weights.items():
+            ids, ws = postings.setdefault(term, ([], []))
+            ids.append(str(doc_id))
+            ws.append(f"{w / norm:.6g}")
+    return {
+        "keys": keys,
+        "idf": idf,
+        "postings": {t: [" ".join(ids), " ".join(ws)] for t, (ids, ws) in postings.items()},
+    }
+
+
+def load_suggest_index(registry: dict, repo_root: Path) -> dict:
+    """Return the suggest index, rebuilding it only when a source fingerprint changed."""
+    fingerprint = source_fingerprint(registry, repo_root)
+    cache_path = get_cache_dir(repo_root) / SUGGEST_INDEX_FILENAME
+    cached = read_json_cache(cache_path)
+    if cached and cached.get("fingerprint") == fingerprint:
+        return cached
+    index = build_suggest_index(registry, repo_root)
+    index["fingerprint"] = fingerprint
+    write_json_cache(cache_path, index)
+    return index
+
+
+def rank_keys(index: dict, query: str, top_k: int = SUGGEST_TOP_K) -> list[tuple[str, float]]:
+    """Top-k (key, cosine score) pairs for query; keys scoring zero are omitted."""
+    counts = Counter(t for t in tokenize(query) if t in index["idf"])
+    if not counts or top_k < 1:
+        return []
+    q = {t: (1.0 + math.log(c)) * index["idf"][t] for t, c in counts.items()}
+    q_norm = math.sqrt(sum(w * w for w in q.values()))
+    keys, postings = index["keys"], index["postings"]
+    if np is not None:
+        ids = np.concatenate([np.array(postings[t][0].split(), dtype=np.int64) for t in q])
+        ws = np.concatenate(
+            [np.array(postings[t][1].split(), dtype=np.float64) * (q[t] / q_norm) for t in q]
+        )
+        scores = np.bincount(ids, weights=ws, minlength=len(keys))
+        k = min(top_k, len(keys))
+        top = np.argpartition(-scores, k - 1)[:k]
+        ranked = sorted(((float(scores[i]), int(i)) for i in top), key=lambda x: (-x[0], x[1]))
+        return [(keys[i], score) for score, i in ranked if score > 0]
+    scores: dict[int, float] = {}
+    for term, qw in q.items():
+        ids, ws = postings[term]
+        for doc_id, w in zip(ids.split(), ws.split()):
+            doc_id = int(doc_id)
+            scores[doc_id] = scores.get(doc_id, 0.0) + float(w) * qw / q_norm
+    top = heapq.nsmallest(top_k, scores.items(), key=lambda x: (-x[1], x[0]))
+    return [(keys[doc_id], score) for doc_id, score in top if score > 0]
+
+
+def split_completed(lines: list[str]) -> tuple[list[str], list[dict]]:
+    """Separate completed entries from PROGRESS.md lines.
+
+    A completed entry is a top-level `- [x]` item, plus its indented continuation lines,
+    under Active Tasks or Completed Tasks. Returns (remaining lines, entries), each entry
+    {"section", "date" (first YYYY-MM-DD in it, or None), "text"}.
+    """
+    kept, entries = [], []
+    section, current, in_code_block = "", None, False
+    for line in lines:
+        if line.lstrip().startswith("```"):
+            in_code_block = not in_code_block
+        if current is not None:
+            if line.strip() and line[0] in " \t":
+                current.append(line)
+                continue
+            entries.append(current)
+            current = None
+        if not in_code_block:
+            if line.startswith("## "):
+                section = line[3:].strip()
+            elif section.lower() in PROGRESS_ARCHIVE_SECTIONS and DONE_ITEM_RE.match(line):
+                current = [section, line]
+                continue
+        kept.append(line)
+    if current is not None:
+        entries.append(current)
+    result = []
+    for section, *body in entries:
+        text = "".join(body).rstrip("\n")
+        date = ENTRY_DATE_RE.search(text)
+        result.append({"section": section, "date": date.group(1) if date else None, "text": text})
+    return kept, result
+
+
+def archive_progress(repo_root: Path) -> int:
+    """Move completed entries from PROGRESS.md to the gzip archive; return how many.
+
+    Each run appends one gzip member of JSON lines, so existing history is never
+    rewritten. The archive is written before PROGRESS.md is atomically replaced: an
+    interrupted run can duplicate entries but never lose them.
+    """
+    progress_path = repo_root / PROGRESS_FILENAME
+    if not progress_path.exists():
+        print(f"Error: {PROGRESS_FILENAME} not found.", file=sys.stderr)
+        sys.exit(1)
+    with open(progress_path, encoding="utf-8", newline="") as f:
+        kept, entries = split_completed(f.readlines())
+    if not entries:
+        return 0
+    archived = datetime.date.today().isoformat()
+    payload = "".join(
+        json.dumps({"archived": archived, **e}, ensure_ascii=False) + "\n" for e in entries
+    )
+    with open(repo_root / PROGRESS_ARCHIVE_FILENAME, "ab") as f:
+        f.write(gzip.compress(payload.encode("utf-8")))
+    fd, tmp = tempfile.mkstemp(dir=progress_path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write("".join(kept))
+        os.chmod(tmp, progress_path.stat().st_mode & 0o777)
+        os.replace(tmp, progress_path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return len(entries)
+
+
+def _archive_records(text: bytes) -> list[dict]:
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def archive_members(data: bytes) -> Iterator[tuple[int, list[dict]]]:
+    """(byte offset, entries) of each gzip member of an archive."""
+    offset = 0
+    while offset < len(data):
+        d = zlib.decompressobj(wbits=31)
+        text = d.decompress(data[offset:]) + d.flush()
+        yield offset, _archive_records(text)
+        if not d.eof:
+            break  # truncated member: nothing more can be read
+        offset = len(data) - len(d.unused_data)
+
+
+def read_archive_member(f, offset: int) -> list[dict]:
+    """Entries of the single gzip member at offset; the rest of the file is not read."""
+    f.seek(offset)
+    d = zlib.decompressobj(wbits=31)
+    chunks = []
+    while not d.eof:
+        block = f.read(64 * 1024)
+        if not block:
+            break
+        chunks.append(d.decompress(block))
+    return _archive_records(b"".join(chunks))
+
+
+def progress_index(repo_root: Path) -> dict:
+    """Term index over the archive, rebuilt only when the archive's (mtime, size) changes.
+
+    {"stat", "entries": [[member offset, position in member], ...], "terms": {term: ids}};
+    ids are space-separated entry numbers, as in the suggest index.
+    """
+    archive_path = repo_root / PROGRESS_ARCHIVE_FILENAME
+    try:
+        st = archive_path.stat()
+    except OSError:
+        return {"entries": [], "terms": {}}
+    stat_sig = [st.st_mtime_ns, st.st_size]
+    cache_path = get_cache_dir(repo_root) / PROGRESS_INDEX_FILENAME
+    cached = read_json_cache(cache_path)
+    if cached and cached.get("stat") == stat_sig:
+        return cached
+    entries, terms = [], {}
+    for offset, records in archive_members(archive_path.read_bytes()):
+        for pos, record in enumerate(records):
+            for term in set(tokenize(record.get("text", ""))):
+                terms.setdefault(term, []).append(str(len(entries)))
+            entries.append([offset, pos])
+    index = {
+        "stat": stat_sig,
+        "entries": entries,
+        "terms": {t: " ".join(ids) for t, ids in terms.items()},
+    }
+    write_json_cache(cache_path, index)
+    return index
+
+
+def search_archive(repo_root: Path, query: str) -> list[dict]:
+    """Archived entries containing every term of query (all entries for an empty query).
+
+    Only the gzip members holding matches are decompressed.
+    """
+    index = progress_index(repo_root)
+    terms = set(tokenize(query))
+    if terms:
+        ids = None
+        for term in terms:
+            found = set(index["terms"].get(term, "").split())
+            ids = found if ids is None else ids & found
+        wanted = sorted(int(i) for i in ids)
+    else:
+        wanted = list(range(len(index["entries"])))
+    if not wanted:
+        return []
+    by_member: dict[int, list[int]] = {}
+    for i in wanted:
+        offset, pos = index["entries"][i]
+        by_member.setdefault(offset, []).append(pos)
+    results = []
+    with open(repo_root / PROGRESS_ARCHIVE_FILENAME, "rb") as f:
+        for offset, positions in by_member.items():
+            records = read_archive_member(f, offset)
+            results.extend(records[pos] for pos in positions)
+    return results
+
+
+def parse_fetch_args(args: list[str]) -> dict | None:
+    """Parse `fetch` arguments into {key, compact, rev, format}; None when malformed."""
+    opts = {"key": None, "compact": False, "rev": None, "format": "text"}
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == "--compact":
+            opts["compact"] = True
+        elif arg == "--rev" and i + 1 < len(args):
+            opts["rev"] = args[i + 1]
+            i += 1
+        elif arg == "--format" and i + 1 < len(args) and args[i + 1] in FETCH_FORMATS:
+            opts["format"] = args[i + 1]
+            i += 1
+        elif arg.startswith("--") or opts["key"] is not None:
+            return None
+        else:
+            opts["key"] = arg
+        i += 1
+    return opts if opts["key"] else None
+
+
+def run_fetch(
+    opts: dict, registry: dict, repo_root: Path, git: GitBlobReader | None = None
+) -> dict:
+    """Fetch opts["key"] in opts["format"]: banner text, or streamed JSON records."""
+    if opts["format"] == "text":
+        return fetch_context(opts["key"], registry, repo_root, opts["compact"], git)
+    return stream_records(opts["key"], registry, repo_root, opts["format"], opts["compact"], git)
+
+
+def fetch_at_rev(opts: dict, repo_root: Path) -> dict:
+    """run_fetch against the tree of opts["rev"], via one cat-file process for all reads."""
+    try:
+        git = GitBlobReader(repo_root, opts["rev"])
+    except (ValueError, FileNotFoundError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    try:
+        registry = load_registry_at_rev(git, opts["key"])
+        return run_fetch(opts, registry, repo_root, git)
+    finally:
+        git.close()
 
 
 def main() -> None:
     cwd = Path.cwd()
     repo_root = get_repo_root(cwd)
     registry_path = repo_root / REGISTRY_FILENAME
-    registry = load_registry(registry_path)
+    fetch_opts = None
+    if len(sys.argv) >= 2 and sys.argv[1] == "fetch":
+        fetch_opts = parse_fetch_args(sys.argv[2:])
+        if fetch_opts is None:
+            print(FETCH_USAGE, file=sys.stderr)
+            sys.exit(1)
+    # A historical fetch never needs (or trusts) the working-tree registry
+    registry = {} if fetch_opts and fetch_opts["rev"] else load_registry(registry_path)
 
     if len(sys.argv) < 2:
-        print("Usage: context.py {list|fetch <key>}", file=sys.stderr)
+        print(USAGE, file=sys.stderr)
         sys.exit(1)
     if sys.argv[1] == "list":
-        for k in registry:
-            if not k.startswith("_"):
+        prefix = sys.argv[2] if len(sys.argv) > 2 else ""
+        for k in list_keys(registry, repo_root):
+            if k.startswith(prefix):
                 print(k)
     elif sys.argv[1] == "fetch":
-        if len(sys.argv) < 3:
-            print("Usage: context.py fetch <key>", file=sys.stderr)
+        key, rev = fetch_opts["key"], fetch_opts["rev"]
+        started = time.perf_counter()
+        if rev:
+            result = fetch_at_rev(fetch_opts, repo_root)
+        else:
+            result = run_fetch(
+                fetch_opts, load_registry_for_key(registry, repo_root, key), repo_root
+            )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        # Close stdout so a reader waiting for EOF has its context before the log write
+        sys.stdout.close()
+        record = {"t": int(time.time()), "key": key, **result, "ms": round(elapsed_ms, 2)}
+        if rev:
+            record["rev"] = rev
+        record_usage(repo_root, record)
+    elif sys.argv[1] == "suggest":
+        args = sys.argv[2:]
+        top_k = SUGGEST_TOP_K
+        if len(args) >= 2 and args[0] == "-k" and args[1].isdigit():
+            top_k, args = int(args[1]), args[2:]
+        if not args:
+            print('Usage: context.py suggest [-k N] "<task description>"', file=sys.stderr)
+            sys.exit(1)
+        index = load_suggest_index(load_full_registry(registry, repo_root), repo_root)
+        for key, score in rank_keys(index, " ".join(args), top_k):
+            print(f"{score:.3f}  {key}")
+    elif sys.argv[1] == "requirements":
+        args = sys.argv[2:]
+        if args and (len(args) != 2 or args[0] != "--branch"):
+            print("Usage: context.py requirements [--branch <name>]", file=sys.stderr)
+            sys.exit(1)
+        branch = args[1] if args else current_branch(repo_root)
+        if not branch:
+            print("Error: No current branch (detached HEAD?); pass --branch.", file=sys.stderr)
+            sys.exit(1)
+        print_requirements(repo_root, branch)
+    elif sys.argv[1] == "progress":
+        args = sys.argv[2:]
+        if args == ["archive"]:
+            moved = archive_progress(repo_root)
+            print(f"Archived {moved} completed entries to {PROGRESS_ARCHIVE_FILENAME}.")
+        elif args[:1] == ["history"]:
+            query = " ".join(args[1:])
+            matches = search_archive(repo_root, query)
+            for record in matches:
+                print(record["text"])
+            summary = f"{len(matches)} archived entries"
+            print(summary + (f" match: {query}" if query else ""), file=sys.stderr)
+        else:
+            print(PROGRESS_USAGE, file=sys.stderr)
+            sys.exit(1)
+    elif sys.argv[1] == "scripts":
+        if len(sys.argv) < 4 or sys.argv[2] != "find":
+            print("Usage: context.py scripts find <term ...>", file=sys.stderr)
+            sys.exit(1)
+        query = " ".join(sys.argv[3:])
+        matches = find_scripts(scripts_index(repo_root), query)
+        if not matches:
+            print(f"No scripts in {SCRIPTS_CATALOG_FILENAME} match: {query}", file=sys.stderr)
+            sys.exit(1)
+        print_scripts(matches)
+    elif sys.argv[1] == "prefetch":
+        args = sys.argv[2:]
+        if args and (len(args) != 2 or args[0] != "--branch"):
+            print("Usage: context.py prefetch [--branch <name>]", file=sys.stderr)
+            sys.exit(1)
+        branch = args[1] if args else current_branch(repo_root) or PREFETCH_DEFAULT_TYPE
+        branch_type, keys = prefetch_keys(registry, branch)
+        if not keys:
+            print(f"No prefetch keys for branch type '{branch_type}' in _meta.prefetch.")
+            return
+        started = time.perf_counter()
+        result = prefetch(registry, repo_root, keys)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(
+            f"Prefetched {result['keys']} keys for {branch_type}: {result['sections']} entries"
+            f" in {result['files']} files ({result['parsed']} parsed, rest cached)"
+            f" in {elapsed_ms:.0f} ms"
+        )
+    elif sys.argv[1] == "sizes":
+        opts = parse_sizes_args(sys.argv[2:], registry)
+        if opts is None:
+            print(SIZES_USAGE, file=sys.stderr)
+            sys.exit(1)
+        full = load_full_registry(registry, repo_root)
+        rows, overlaps = key_sizes(full, repo_root)
+        violations = print_sizes(rows, overlaps, opts["key_tokens"], opts["total_tokens"])
+        if opts["check"] and violations:
+            print("Context budget exceeded: " + "; ".join(violations), file=sys.stderr)
             sys.exit(1)
-        fetch_context(sys.argv[2], registry, repo_root)
+    elif sys.argv[1] == "stats":
+        sort_by = "fetches"
+        if len(sys.argv) > 2:
+            valid = len(sys.argv) == 4 and sys.argv[2] == "--sort"
+            if not valid or sys.argv[3] not in STATS_SORT_FIELDS:
+                print("Usage: context.py stats [--sort fetches|bytes|p95]", file=sys.stderr)
+                sys.exit(1)
+            sort_by = sys.argv[3]
+        print_stats(read_usage(repo_root), sort_by)
     else:
-        print("Usage: context.py {list|fetch <key>}", file=sys.stderr)
+        print(USAGE, file=sys.stderr)
         sys.exit(1)
 
 
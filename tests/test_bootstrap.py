@@ -1,5 +1,7 @@
 """Tests for scripts/bootstrap.py — AI Protocol Bootstrapper."""
 
+import json
+import os
 import subprocess
 import sys
 
@@ -30,6 +32,35 @@ class TestResolveRoots:
         assert (templates / "PROTOCOL_BOOTLOADER.md").exists()
 
 
+class TestRendering:
+    def test_compile_placeholders_empty(self, bootstrap_module):
+        assert bootstrap_module.compile_placeholders({}) is None
+
+    def test_render_single_pass(self, bootstrap_module):
+        variables = {"A": "{{B}}", "B": "bee"}
+        pattern = bootstrap_module.compile_placeholders(variables)
+        text, count = bootstrap_module.render_text("{{A}} {{B}} {{C}}", pattern, variables)
+        # Substituted values are not re-scanned; unknown placeholders are left alone
+        assert text == "{{B}} bee {{C}}"
+        assert count == 2
+
+    def test_parse_var_args(self, bootstrap_module):
+        result = bootstrap_module.parse_var_args(["GOAL=Ship it", "EMPTY=", "EQ=a=b"])
+        assert result == {"GOAL": "Ship it", "EMPTY": "", "EQ": "a=b"}
+
+    def test_parse_var_args_invalid_exits(self, bootstrap_module):
+        with pytest.raises(SystemExit) as exc_info:
+            bootstrap_module.parse_var_args(["NOEQUALS"])
+        assert exc_info.value.code == 1
+
+    def test_vars_file_must_be_object(self, bootstrap_module, tmp_path):
+        vars_file = tmp_path / "vars.json"
+        vars_file.write_text('["not", "an", "object"]')
+        with pytest.raises(SystemExit) as exc_info:
+            bootstrap_module.load_vars_file(vars_file)
+        assert exc_info.value.code == 1
+
+
 class TestBootstrapNormal:
     """Unit tests that drive main() via monkeypatched sys.argv."""
 
@@ -115,6 +146,79 @@ class TestBootstrapNormal:
         assert "{{MODULE_NAME}}" not in content
         assert "{{ONE_LINE_DESCRIPTION}}" not in content
 
+    def test_vars_render_markdown_payload_files(
+        self, bootstrap_module, tmp_path, monkeypatch
+    ):
+        templates = tmp_path / "templates"
+        (templates / "docs").mkdir(parents=True)
+        (templates / "PROTOCOL_BOOTLOADER.md").write_text("Agent for {{PROJECT}}\n")
+        (templates / "PROTOCOL.md").write_text("- **Goal:** {{GOAL}}\n- {{UNSET}}\n")
+        (templates / "docs" / "TESTING.md").write_text("Run {{TEST_CMD}}\n")
+        vars_file = tmp_path / "vars.json"
+        vars_file.write_text(json.dumps({"PROJECT": "demo", "GOAL": "from file"}))
+        target = tmp_path / "target"
+        target.mkdir()
+        monkeypatch.setattr(bootstrap_module, "resolve_roots", lambda: templates)
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            [
+                "bootstrap.py",
+                str(target),
+                "--agent",
+                "claude",
+                "--vars-file",
+                str(vars_file),
+                "--var",
+                "GOAL=from flag",
+                "--var",
+                "TEST_CMD=uv run pytest",
+            ],
+        )
+        bootstrap_module.main()
+        assert (target / "CLAUDE.md").read_text() == "Agent for demo\n"
+        assert (target / "PROTOCOL.md").read_text() == "- **Goal:** from flag\n- {{UNSET}}\n"
+        assert (target / "docs" / "TESTING.md").read_text() == "Run uv run pytest\n"
+
+    def test_vars_leave_code_and_json_untouched(self, bootstrap_module, tmp_path, monkeypatch):
+        """A placeholder name that matches code syntax must not rewrite context.py."""
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            [
+                "bootstrap.py",
+                str(tmp_path),
+                "--agent",
+                "claude",
+                "--var",
+                "commit=x",
+                "--var",
+                "KEY=\"quoted\"",
+            ],
+        )
+        bootstrap_module.main()
+        templates = REPO_ROOT / "templates"
+        for rel in ("scripts/context.py", "docs/context_registry.json"):
+            assert (tmp_path / rel).read_bytes() == (templates / rel).read_bytes(), rel
+
+    def test_braces_in_code_payload_not_rendered(self, bootstrap_module, tmp_path, monkeypatch):
+        templates = tmp_path / "templates"
+        (templates / "scripts").mkdir(parents=True)
+        (templates / "docs").mkdir()
+        (templates / "PROTOCOL_BOOTLOADER.md").write_text("At {{commit}}\n")
+        (templates / "scripts" / "context.py").write_text('spec = f"{rev}^{{commit}}"\n')
+        (templates / "docs" / "context_registry.json").write_text('{"a": "{{commit}}"}\n')
+        target = tmp_path / "target"
+        target.mkdir()
+        monkeypatch.setattr(bootstrap_module, "resolve_roots", lambda: templates)
+        monkeypatch.setattr(
+            sys, "argv", ["bootstrap.py", str(target), "--agent", "claude", "--var", "commit=x"]
+        )
+        bootstrap_module.main()
+        assert (target / "CLAUDE.md").read_text() == "At x\n"
+        assert (target / "scripts" / "context.py").read_text() == 'spec = f"{rev}^{{commit}}"\n'
+        assert (target / "docs" / "context_registry.json").read_text() == '{"a": "{{commit}}"}\n'
+
     def test_bad_target_exits(self, bootstrap_module, monkeypatch):
         monkeypatch.setattr(
             sys,
@@ -138,6 +242,76 @@ class TestBootstrapNormal:
         assert created == EXPECTED_DEST_FILES
 
 
+class TestAtomicWrites:
+    def test_copy_preserves_mode_and_leaves_no_temp(self, bootstrap_module, tmp_path):
+        src = tmp_path / "src.py"
+        src.write_text("print('hi')\n")
+        src.chmod(0o755)
+        dest_dir = tmp_path / "dest"
+        dest_dir.mkdir()
+        (dest_dir / "out.py").write_text("old\n")
+        assert bootstrap_module.copy_rendered(src, dest_dir / "out.py", None, {}) == 0
+        assert (dest_dir / "out.py").read_text() == "print('hi')\n"
+        assert (dest_dir / "out.py").stat().st_mode & 0o777 == 0o755
+        assert [p.name for p in dest_dir.iterdir()] == ["out.py"]
+
+    def test_failed_rename_keeps_original(self, bootstrap_module, tmp_path, monkeypatch):
+        src = tmp_path / "src.md"
+        src.write_text("Hello {{NAME}}\n")
+        dest_dir = tmp_path / "dest"
+        dest_dir.mkdir()
+        (dest_dir / "out.md").write_text("old\n")
+
+        def failing_replace(*args):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(bootstrap_module.os, "replace", failing_replace)
+        variables = {"NAME": "world"}
+        pattern = bootstrap_module.compile_placeholders(variables)
+        with pytest.raises(OSError):
+            bootstrap_module.copy_rendered(src, dest_dir / "out.md", pattern, variables)
+        assert (dest_dir / "out.md").read_text() == "old\n"
+        assert [p.name for p in dest_dir.iterdir()] == ["out.md"]
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="advisory locks need fcntl")
+    def test_target_lock_is_exclusive(self, bootstrap_module, tmp_path):
+        import fcntl
+
+        lock = tmp_path / ".ai_protocol-bootstrap.lock"
+        with bootstrap_module.target_lock(tmp_path):
+            with open(lock) as other:
+                with pytest.raises(BlockingIOError):
+                    fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        assert not lock.exists()  # the dot-file leaves with the run
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="advisory locks need fcntl")
+    def test_git_target_locks_in_git_dir(self, bootstrap_module, tmp_path):
+        import fcntl
+
+        (tmp_path / ".git").mkdir()
+        lock = tmp_path / ".git" / "ai_protocol-bootstrap.lock"
+        lock.touch(mode=0o444)  # left by another user: flock needs no write access
+        with bootstrap_module.target_lock(tmp_path):
+            with open(lock) as other:
+                with pytest.raises(BlockingIOError):
+                    fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        assert [p.name for p in tmp_path.iterdir()] == [".git"]
+        with open(lock) as other:
+            fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)  # released on exit
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="advisory locks need fcntl")
+    def test_lock_falls_back_to_temp_dir(self, bootstrap_module, tmp_path):
+        paths = bootstrap_module.lock_paths(tmp_path / "missing")
+        assert [transient for _, transient in paths] == [True, False]
+        fallback = paths[-1][0]
+        assert tmp_path not in fallback.parents
+        try:
+            with bootstrap_module.target_lock(tmp_path / "missing"):
+                assert fallback.exists()
+        finally:
+            fallback.unlink(missing_ok=True)
+
+
 @pytest.mark.integration
 class TestBootstrapCLI:
     SCRIPT = str(REPO_ROOT / "scripts" / "bootstrap.py")
@@ -153,3 +327,25 @@ class TestBootstrapCLI:
         assert "Bootstrap Complete" in result.stdout
         for rel in EXPECTED_DEST_FILES:
             assert (tmp_path / rel).exists(), f"Missing: {rel}"
+
+    def test_parallel_runs_same_target(self, tmp_path):
+        cmd = [sys.executable, self.SCRIPT, str(tmp_path), "--agent", "claude", "--force"]
+        procs = [
+            subprocess.Popen(
+                cmd + ["--var", f"RUN=run{i}"], stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+            for i in range(4)
+        ]
+        for proc in procs:
+            proc.communicate(timeout=30)
+            assert proc.returncode == 0
+        created = {
+            os.path.relpath(os.path.join(root, name), tmp_path)
+            for root, _, names in os.walk(tmp_path)
+            for name in names
+        }
+        assert created == EXPECTED_DEST_FILES  # no staged temp files left behind
+        templates = REPO_ROOT / "templates"
+        assert (tmp_path / "scripts" / "context.py").read_bytes() == (
+            templates / "scripts" / "context.py"
+        ).read_bytes()
@@ -1,8 +1,11 @@
 """Tests for scripts/check_protocol.py — Protocol version drift checker."""
 
+import csv
+import io
 import json
 import subprocess
 import sys
+from pathlib import Path
 
 import pytest
 
@@ -67,6 +70,291 @@ class TestReadTargetVersion:
         (docs / "context_registry.json").write_text("{bad json")
         assert check_protocol_module.read_target_version(tmp_path) is None
 
+    def test_malformed_meta(self, check_protocol_module):
+        parse = check_protocol_module.parse_registry_version
+        assert parse(b'{"_meta": ["x"]}') is None
+        assert parse(b'{"_meta": {"protocol_version": ["1.0.0"]}}') is None
+
+
+# ---------------------------------------------------------------------------
+# Content drift
+# ---------------------------------------------------------------------------
+
+TEMPLATE_MD = """# Doc
+
+## Rules
+Never push to main.
+
+## Project <!-- CUSTOMIZE -->
+- **Goal:** [Enter project goal]
+
+### Details
+[Fill in]
+
+## Workflow
+<!-- CUSTOMIZE: document commands -->
+| When | Command |
+
+## Tail
+Fixed text.
+"""
+
+
+class TestNormalizeCustomized:
+    def test_customize_sections_ignored(self, check_protocol_module):
+        edited = TEMPLATE_MD.replace("[Enter project goal]", "Ship a CLI").replace(
+            "[Fill in]", "Many details\n\nacross lines"
+        ).replace("| When | Command |", "| Start | make up |")
+        normalize = check_protocol_module.normalize_customized
+        assert normalize(edited) == normalize(TEMPLATE_MD)
+
+    def test_protocol_text_change_detected(self, check_protocol_module):
+        edited = TEMPLATE_MD.replace("Fixed text.", "Changed text.")
+        normalize = check_protocol_module.normalize_customized
+        assert normalize(edited) != normalize(TEMPLATE_MD)
+
+    def test_real_protocol_template_has_customize_regions(self, check_protocol_module):
+        text = (REPO_ROOT / "templates" / "PROTOCOL.md").read_text(encoding="utf-8")
+        normalized = check_protocol_module.normalize_customized(text)
+        assert "[Enter project goal]" not in normalized
+        assert "Safety & Autonomy" in normalized
+
+
+class TestCheckContent:
+    def _templates(self, check_protocol_module, tmp_path):
+        templates = tmp_path / "templates"
+        (templates / "scripts").mkdir(parents=True)
+        (templates / "PROTOCOL.md").write_text(TEMPLATE_MD)
+        (templates / "scripts" / "context.py").write_text("print('v2')\n")
+        return check_protocol_module.template_digests(templates)
+
+    def test_classifies_each_file(self, check_protocol_module, tmp_path):
+        templates = self._templates(check_protocol_module, tmp_path)
+        target = tmp_path / "target"
+        (target / "scripts").mkdir(parents=True)
+        (target / "PROTOCOL.md").write_text(TEMPLATE_MD.replace("[Fill in]", "Mine"))
+        (target / "scripts" / "context.py").write_text("print('v1')\n")
+        result = check_protocol_module.check_content(target, templates)
+        assert result == {"PROTOCOL.md": "customized", "scripts/context.py": "stale"}
+
+    def test_identical_and_missing(self, check_protocol_module, tmp_path):
+        templates = self._templates(check_protocol_module, tmp_path)
+        target = tmp_path / "target"
+        target.mkdir()
+        (target / "PROTOCOL.md").write_text(TEMPLATE_MD)
+        result = check_protocol_module.check_content(target, templates)
+        assert result == {"PROTOCOL.md": "identical", "scripts/context.py": "missing"}
+
+    def test_cache_reuses_unchanged_files(self, check_protocol_module, tmp_path, monkeypatch):
+        doc = tmp_path / "PROTOCOL.md"
+        doc.write_text(TEMPLATE_MD)
+        cache = {}
+        first = check_protocol_module.file_digests(doc, "PROTOCOL.md", cache)
+        calls = []
+        real = check_protocol_module.content_digests
+        monkeypatch.setattr(
+            check_protocol_module,
+            "content_digests",
+            lambda *a: calls.append(a) or real(*a),
+        )
+        assert check_protocol_module.file_digests(doc, "PROTOCOL.md", cache) == first
+        assert calls == []
+        doc.write_text(TEMPLATE_MD + "extra\n")
+        assert check_protocol_module.file_digests(doc, "PROTOCOL.md", cache) != first
+        assert len(calls) == 1
+
+    def test_cache_round_trip(self, check_protocol_module, tmp_path):
+        cache_path = tmp_path / "cache" / "hash-cache.json"
+        check_protocol_module.save_hash_cache(cache_path, {"k": {"size": 1}})
+        assert check_protocol_module.load_hash_cache(cache_path) == {"k": {"size": 1}}
+        assert check_protocol_module.load_hash_cache(tmp_path / "missing.json") == {}
+
+    def test_save_keeps_only_entries_this_scan_used(self, check_protocol_module, tmp_path):
+        doc, gone = tmp_path / "PROTOCOL.md", tmp_path / "deleted.md"
+        doc.write_text(TEMPLATE_MD)
+        gone.write_text(TEMPLATE_MD)
+        old = {}
+        check_protocol_module.file_digests(gone, "PROTOCOL.md", old)
+        old["blob:ab:PROTOCOL.md"] = {"digests": {}}
+        cache_path = tmp_path / "hash-cache.json"
+        check_protocol_module.save_hash_cache(cache_path, old)
+        gone.unlink()
+        cache = check_protocol_module.load_hash_cache(cache_path)
+        check_protocol_module.file_digests(doc, "PROTOCOL.md", cache)
+        assert check_protocol_module.file_digests(gone, "PROTOCOL.md", cache) is None
+        assert set(cache.live()) == {str(doc), "blob:ab:PROTOCOL.md"}
+
+
+# ---------------------------------------------------------------------------
+# Fleet scan
+# ---------------------------------------------------------------------------
+
+
+def _make_repo(root, version):
+    docs = root / "docs"
+    docs.mkdir(parents=True)
+    registry = {"_meta": {"protocol_version": version}} if version else {}
+    (docs / "context_registry.json").write_text(json.dumps(registry))
+    return root
+
+
+class TestClassifyVersion:
+    def test_statuses(self, check_protocol_module):
+        classify = check_protocol_module.classify_version
+        assert classify("1.0.0", "1.0.0") == "ok"
+        assert classify("1.0.0", "0.9.0") == "drift"
+        assert classify("1.0.0", None) == "unversioned"
+        assert classify(None, "1.0.0") == "unknown"
+
+
+class TestFindProtocolRepos:
+    def test_finds_nested_repos_in_order(self, check_protocol_module, tmp_path):
+        _make_repo(tmp_path / "b", "1.0.0")
+        _make_repo(tmp_path / "a", "1.0.0")
+        _make_repo(tmp_path / "a" / "sub", "1.0.0")
+        found = list(check_protocol_module.find_protocol_repos(tmp_path))
+        assert found == [tmp_path / "a", tmp_path / "a" / "sub", tmp_path / "b"]
+
+    def test_prunes_vendor_dirs(self, check_protocol_module, tmp_path):
+        for pruned in (".git", "node_modules", ".venv"):
+            _make_repo(tmp_path / pruned / "pkg", "1.0.0")
+        assert list(check_protocol_module.find_protocol_repos(tmp_path)) == []
+
+    def test_does_not_follow_symlinks(self, check_protocol_module, tmp_path):
+        real = _make_repo(tmp_path / "real", "1.0.0")
+        (tmp_path / "link").symlink_to(real, target_is_directory=True)
+        assert list(check_protocol_module.find_protocol_repos(tmp_path)) == [real]
+
+
+class TestWriteRecords:
+    def test_jsonl_counts_drift(self, check_protocol_module, tmp_path):
+        _make_repo(tmp_path / "ok", "1.0.0")
+        _make_repo(tmp_path / "old", "0.1.0")
+        _make_repo(tmp_path / "bare", None)
+        out = io.StringIO()
+        records = check_protocol_module.scan(tmp_path, "1.0.0", workers=4)
+        drifted = check_protocol_module.write_records(records, "jsonl", out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert drifted == 1
+        assert {Path(r["path"]).name: r["status"] for r in rows} == {
+            "bare": "unversioned",
+            "ok": "ok",
+            "old": "drift",
+        }
+
+    def test_one_bad_repo_does_not_abort_scan(self, check_protocol_module, tmp_path, monkeypatch):
+        _make_repo(tmp_path / "a", "1.0.0")
+        _make_repo(tmp_path / "b", "1.0.0")
+        real = check_protocol_module.check_content
+
+        def check_content(root, *args):
+            if root.name == "a":
+                raise ValueError("corrupt checkout")
+            return real(root, *args)
+
+        monkeypatch.setattr(check_protocol_module, "check_content", check_content)
+        records = list(check_protocol_module.scan(tmp_path, "1.0.0", workers=2))
+        assert [(r["status"], r.get("error")) for r in records] == [
+            ("error", "ValueError: corrupt checkout"),
+            ("ok", None),
+        ]
+
+    def test_csv_header_and_rows(self, check_protocol_module, tmp_path):
+        _make_repo(tmp_path / "ok", "1.0.0")
+        out = io.StringIO()
+        records = check_protocol_module.scan(tmp_path, "1.0.0", workers=1)
+        check_protocol_module.write_records(records, "csv", out)
+        rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+        assert rows[0]["status"] == "ok"
+        assert rows[0]["target_version"] == "1.0.0"
+
+
+# ---------------------------------------------------------------------------
+# Git object mode
+# ---------------------------------------------------------------------------
+
+
+def _git(cwd, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@t", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.fixture
+def bare_mirror(tmp_path):
+    """A bare repo with main (current protocol) and legacy (old version, stale context.py)."""
+    version = (REPO_ROOT / "VERSION").read_text().strip()
+    work = tmp_path / "work"
+    _make_repo(work, version)
+    (work / "scripts").mkdir()
+    context_src = REPO_ROOT / "templates" / "scripts" / "context.py"
+    (work / "scripts" / "context.py").write_bytes(context_src.read_bytes())
+    _git(work, "init", "-q", "-b", "main")
+    _git(work, "add", ".")
+    _git(work, "commit", "-q", "-m", "current")
+    _git(work, "checkout", "-q", "-b", "legacy")
+    (work / "docs" / "context_registry.json").write_text(
+        json.dumps({"_meta": {"protocol_version": "0.9.0"}})
+    )
+    (work / "scripts" / "context.py").write_text("# old engine\n")
+    _git(work, "commit", "-q", "-am", "legacy")
+    mirror = tmp_path / "mirrors" / "project.git"
+    _git(tmp_path, "clone", "-q", "--bare", str(work), str(mirror))
+    return mirror
+
+
+class TestGitBlobReader:
+    def test_reads_blobs_and_missing(self, check_protocol_module, bare_mirror):
+        with check_protocol_module.GitBlobReader(bare_mirror) as reader:
+            blobs = reader.read_many("main", ["docs/context_registry.json", "nope.md"])
+            assert blobs["nope.md"] is None
+            oid, data = blobs["docs/context_registry.json"]
+            assert len(oid) == 40
+            assert check_protocol_module.parse_registry_version(data)
+            # The same pipe keeps serving later requests
+            assert reader.read("legacy", "scripts/context.py")[1] == b"# old engine\n"
+
+    def test_check_all_branches(self, check_protocol_module, bare_mirror):
+        templates = check_protocol_module.template_digests(REPO_ROOT / "templates")
+        version = (REPO_ROOT / "VERSION").read_text().strip()
+        records = check_protocol_module.check_git_repo(bare_mirror, [], version, templates)
+        by_ref = {r["ref"]: r for r in records}
+        assert by_ref["main"]["status"] == "ok"
+        assert by_ref["legacy"]["status"] == "drift"
+        assert by_ref["legacy"]["stale_files"] == ["scripts/context.py"]
+
+    def test_not_a_repo_is_error(self, check_protocol_module, tmp_path):
+        records = check_protocol_module.check_git_repo(tmp_path, [], "1.0.0", {})
+        assert [r["status"] for r in records] == ["error"]
+        assert records[0]["error"] == "not a git repository"
+
+    def test_unknown_ref_is_error(self, check_protocol_module, bare_mirror):
+        templates = check_protocol_module.template_digests(REPO_ROOT / "templates")
+        records = check_protocol_module.check_git_repo(
+            bare_mirror, ["main", "nosuchbranch"], "1.0.0", templates
+        )
+        by_ref = {r["ref"]: r["status"] for r in records}
+        assert by_ref["nosuchbranch"] == "error"
+        assert by_ref["main"] != "error"
+
+    def test_scan_skips_refs_without_registry(self, check_protocol_module, bare_mirror, tmp_path):
+        clone = tmp_path / "clone"
+        _git(tmp_path, "clone", "-q", str(bare_mirror), str(clone))
+        _git(clone, "checkout", "-q", "-b", "bare-docs")
+        _git(clone, "rm", "-q", "docs/context_registry.json")
+        _git(clone, "commit", "-q", "-m", "no registry")
+        _git(clone, "push", "-q", "origin", "bare-docs")
+        version = (REPO_ROOT / "VERSION").read_text().strip()
+        records = check_protocol_module.scan_git(tmp_path / "mirrors", [], version, 1, {})
+        assert sorted(r["ref"] for r in records) == ["legacy", "main"]
+
+    def test_find_bare_repos(self, check_protocol_module, bare_mirror, tmp_path):
+        found = list(check_protocol_module.find_bare_repos(tmp_path / "mirrors"))
+        assert found == [bare_mirror]
+
 
 # ---------------------------------------------------------------------------
 # Integration tests (subprocess)
@@ -118,3 +406,53 @@ class TestCheckProtocolCLI:
         result = self._run("/tmp/nonexistent_dir_xyz_999")
         assert result.returncode == 1
         assert "Error" in result.stdout or "does not exist" in result.stdout
+
+    def test_scan_exits_on_drift(self, tmp_path):
+        _make_repo(tmp_path / "stale", "0.0.0-fake")
+        result = self._run("--scan", str(tmp_path), "--no-hash-cache")
+        assert result.returncode == 1
+        assert json.loads(result.stdout)["status"] == "drift"
+
+    def test_matching_version_with_stale_file_is_drift(self, tmp_path):
+        version = (REPO_ROOT / "VERSION").read_text().strip()
+        self._setup_target(tmp_path, version)
+        (tmp_path / "scripts").mkdir()
+        (tmp_path / "scripts" / "context.py").write_text("# an old context engine\n")
+        result = self._run(str(tmp_path))
+        assert result.returncode == 1
+        assert "stale: scripts/context.py" in result.stdout
+
+    def test_scan_reports_stale_files(self, tmp_path):
+        version = (REPO_ROOT / "VERSION").read_text().strip()
+        repo = _make_repo(tmp_path / "repo", version)
+        (repo / "scripts").mkdir()
+        (repo / "scripts" / "context.py").write_text("# an old context engine\n")
+        cache = tmp_path / "hash-cache.json"
+        result = self._run("--scan", str(tmp_path), "--hash-cache", str(cache))
+        record = json.loads(result.stdout)
+        assert result.returncode == 1
+        assert record["status"] == "stale"
+        assert record["stale_files"] == ["scripts/context.py"]
+        assert str(repo / "scripts" / "context.py") in json.loads(cache.read_text())
+
+    def test_git_scan_all_branches(self, bare_mirror):
+        result = self._run(
+            "--scan", str(bare_mirror.parent), "--git", "--all-branches", "--no-hash-cache"
+        )
+        statuses = {
+            r["ref"]: r["status"] for r in map(json.loads, result.stdout.splitlines())
+        }
+        assert result.returncode == 1
+        assert statuses == {"legacy": "drift", "main": "ok"}
+
+    def test_git_not_a_repo_fails(self, tmp_path):
+        for args in (["--git"], ["--git", "--all-branches"]):
+            result = self._run(str(tmp_path), *args)
+            record = json.loads(result.stdout)
+            assert result.returncode == 1
+            assert record["status"] == "error"
+
+    def test_git_unknown_rev_fails(self, bare_mirror):
+        result = self._run(str(bare_mirror), "--git", "--rev", "nosuchbranch")
+        assert result.returncode == 1
+        assert json.loads(result.stdout)["status"] == "error"
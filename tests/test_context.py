@@ -1,8 +1,14 @@
 """Tests for templates/scripts/context.py — JIT Context Engine."""
 
+import gzip
+import hashlib
 import json
+import os
+import random
 import subprocess
 import sys
+import time
+import tracemalloc
 from pathlib import Path
 
 import pytest
@@ -136,6 +142,108 @@ class TestExtractSection:
         assert "Error" in result
 
 
+# ---------------------------------------------------------------------------
+# extract_section guards (fuzz / pathological input)
+# ---------------------------------------------------------------------------
+
+# Seeded fragments for the fuzz corpus: headings, fences, hashes, noise and long lines
+FUZZ_FRAGMENTS = [
+    "## Target\n",
+    "# Target\n",
+    "### target sub\n",
+    "## Other\n",
+    "```\n",
+    "```python\n",
+    "  ```\n",
+    "#no-space heading\n",
+    "####### too deep\n",
+    "# \n",
+    "plain text\n",
+    "\n",
+    "#" * 50 + " Target\n",
+    "x" * 5000 + "\n",
+    "## Target " + "y" * 5000 + "\n",
+]
+TIME_BUDGET_S = 2.0
+MEMORY_BUDGET_BYTES = 8 * 1024 * 1024
+
+
+def _measure(fn):
+    """Run fn timed, then again under tracemalloc; return (result, seconds, peak bytes)."""
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+class TestExtractSectionGuards:
+    def test_fuzz_properties(self, context_module):
+        """Random docs: output is bounded and, when found, opens with the matching heading."""
+        rng = random.Random(20260212)
+        limit = context_module.MAX_SECTION_CHARS + 100
+        for _ in range(300):
+            lines = rng.choices(FUZZ_FRAGMENTS, k=rng.randint(0, 200))
+            result = context_module.extract_section_lines(lines, "Target")
+            assert len(result) <= limit
+            if result != "Section not found.":
+                first = result.splitlines()[0]
+                assert first.startswith("#")
+                assert "target" in first.lower()
+                assert len(first) <= context_module.MAX_LINE_LENGTH
+
+    def test_unterminated_fences_file(self, context_module, tmp_path):
+        """An unterminated fence swallowing 500k lines: bounded time, memory and output."""
+        md = tmp_path / "fences.md"
+        with open(md, "w", encoding="utf-8") as f:
+            f.write("## Target\n```\n")
+            f.writelines("## Fenced, not a header\n" for _ in range(500_000))
+        result, elapsed, peak = _measure(lambda: context_module.extract_section(md, "Target"))
+        assert result.endswith("characters]")
+        assert len(result) <= context_module.MAX_SECTION_CHARS + 100
+        assert elapsed < TIME_BUDGET_S
+        assert peak < MEMORY_BUDGET_BYTES
+
+    def test_missing_title_in_huge_file(self, context_module, tmp_path):
+        """A full scan for an absent title streams the file instead of loading it."""
+        md = tmp_path / "big.md"
+        with open(md, "w", encoding="utf-8") as f:
+            f.writelines(f"## Heading {i}\nbody line\n" for i in range(100_000))
+        result, elapsed, peak = _measure(lambda: context_module.extract_section(md, "Absent"))
+        assert result == "Section not found."
+        assert elapsed < TIME_BUDGET_S
+        assert peak < MEMORY_BUDGET_BYTES
+
+    def test_many_same_titled_headings(self, context_module):
+        lines = ["## Target\n", "first body\n"] + ["## Target\n", "dup\n"] * 50_000
+        result, elapsed, _ = _measure(
+            lambda: context_module.extract_section_lines(lines, "Target")
+        )
+        assert result == "## Target\nfirst body"
+        assert elapsed < TIME_BUDGET_S
+
+    def test_long_lines_are_clipped_and_never_headings(self, context_module):
+        long_heading = "## Target " + "z" * 100_000 + "\n"
+        assert context_module.extract_section_lines([long_heading], "Target") == (
+            "Section not found."
+        )
+        lines = ["## Target\n", "a" * 100_000 + "\n", "## Next\n"]
+        result = context_module.extract_section_lines(lines, "Target")
+        assert "[line truncated]" in result
+        assert len(result) < context_module.MAX_LINE_LENGTH + 100
+
+    def test_invalid_utf8_does_not_raise(self, context_module, tmp_path):
+        md = tmp_path / "bad.md"
+        md.write_bytes(b"## Target\n\xff\xfe broken\n## Next\n")
+        result = context_module.extract_section(md, "Target")
+        assert "broken" in result
+
+
 # ---------------------------------------------------------------------------
 # normalize_entries
 # ---------------------------------------------------------------------------
@@ -220,6 +328,1138 @@ class TestFetchContext:
         captured = capsys.readouterr()
         assert "Error" in captured.err or "not found" in captured.err
 
+    def test_missing_section_file_reported_in_context(self, context_module, tmp_path, capsys):
+        registry = self._make_registry(
+            tmp_path, {"broken": {"file": "nonexistent.md", "section": "Intro"}}
+        )
+        context_module.fetch_context("broken", registry, tmp_path)
+        captured = capsys.readouterr()
+        assert f"Error: File not found: {tmp_path / 'nonexistent.md'}" in captured.out
+        assert captured.err == ""
+
+    def test_returns_bytes_and_sections(self, context_module, tmp_path, capsys):
+        (tmp_path / "a.md").write_text("Héllo\n")
+        (tmp_path / "b.md").write_text("## S\nbody\n")
+        registry = self._make_registry(
+            tmp_path, {"multi": ["a.md", {"file": "b.md", "section": "S"}]}
+        )
+        result = context_module.fetch_context("multi", registry, tmp_path)
+        out = capsys.readouterr().out
+        assert result == {"bytes": len(out.encode("utf-8")), "sections": 2}
+
+
+# ---------------------------------------------------------------------------
+# Include directives (transclusion)
+# ---------------------------------------------------------------------------
+
+
+class TestIncludes:
+    @pytest.fixture(autouse=True)
+    def _isolated_cache(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("CONTEXT_CACHE_DIR", str(tmp_path / "cache"))
+
+    def test_section_and_whole_file_includes(self, context_module, tmp_path):
+        (tmp_path / "shared.md").write_text("## Rule\nUse uv.\n## Other\nNo.\n")
+        (tmp_path / "note.md").write_text("A note.\n")
+        text = "Intro\n<!-- include: shared.md#Rule -->\n  <!-- include: note.md -->\nEnd\n"
+        resolver = context_module.IncludeResolver(tmp_path)
+        out = resolver.expand(text, ("main.md", ""))
+        assert out == "Intro\n## Rule\nUse uv.\nA note.\nEnd\n"
+
+    def test_nested_includes(self, context_module, tmp_path):
+        (tmp_path / "a.md").write_text("A1\n<!-- include: b.md -->\n")
+        (tmp_path / "b.md").write_text("B1\n")
+        resolver = context_module.IncludeResolver(tmp_path)
+        assert resolver.expand("<!-- include: a.md -->\n", ("top.md", "")) == "A1\nB1\n"
+
+    def test_cycle_reported(self, context_module, tmp_path):
+        (tmp_path / "a.md").write_text("<!-- include: b.md -->\n")
+        (tmp_path / "b.md").write_text("<!-- include: a.md -->\n")
+        resolver = context_module.IncludeResolver(tmp_path)
+        out = resolver.expand("<!-- include: a.md -->", ("top.md", ""))
+        assert "Error: include cycle: top.md -> a.md -> b.md -> a.md" in out
+
+    def test_directive_in_code_block_untouched(self, context_module, tmp_path):
+        text = "```\n<!-- include: x.md -->\n```\n"
+        resolver = context_module.IncludeResolver(tmp_path)
+        assert resolver.expand(text, ("top.md", "")) == text
+
+    def test_missing_include(self, context_module, tmp_path):
+        resolver = context_module.IncludeResolver(tmp_path)
+        out = resolver.expand("<!-- include: nope.md#Sec -->", ("top.md", ""))
+        assert out.startswith("Error: File not found")
+
+    def test_include_outside_repo_rejected(self, context_module, tmp_path):
+        repo = tmp_path / "repo"
+        repo.mkdir()
+        (tmp_path / "secret.md").write_text("## Key\nhunter2\n")
+        (repo / "link.md").symlink_to(tmp_path / "secret.md")
+        resolver = context_module.IncludeResolver(repo)
+        for target in ("../secret.md#Key", str(tmp_path / "secret.md"), "link.md"):
+            out = resolver.expand(f"<!-- include: {target} -->", ("top.md", ""))
+            assert out.startswith("Error: include outside the repository")
+            assert "hunter2" not in out
+
+    def test_shared_fragment_parsed_once(self, context_module, tmp_path, monkeypatch):
+        (tmp_path / "shared.md").write_text("## Rule\nUse uv.\n")
+        calls = []
+        real = context_module.extract_section
+        monkeypatch.setattr(
+            context_module, "extract_section", lambda *a: calls.append(a) or real(*a)
+        )
+        resolver = context_module.IncludeResolver(tmp_path, use_cache=False)
+        for top in ("a.md", "b.md", "c.md"):
+            resolver.expand("<!-- include: shared.md#Rule -->", (top, ""))
+        assert len(calls) == 1
+
+    def test_persistent_cache_invalidated_by_dependency(self, context_module, tmp_path):
+        (tmp_path / "a.md").write_text("<!-- include: b.md -->\n")
+        (tmp_path / "b.md").write_text("old\n")
+        first = context_module.IncludeResolver(tmp_path)
+        assert first.expand("<!-- include: a.md -->", ("t", "")) == "old"
+        first.save()
+        cached = context_module.IncludeResolver(tmp_path)
+        assert cached._cached(("a.md", "")) == ("old", frozenset({"a.md", "b.md"}))
+        (tmp_path / "b.md").write_text("brand new\n")
+        fresh = context_module.IncludeResolver(tmp_path)
+        assert fresh._cached(("a.md", "")) is None
+        assert fresh.expand("<!-- include: a.md -->", ("t", "")) == "brand new"
+
+    def test_fetch_expands_includes(self, context_module, tmp_path, capsys):
+        (tmp_path / "shared.md").write_text("## Rule\nUse uv.\n")
+        (tmp_path / "doc.md").write_text("## Std\n<!-- include: shared.md#Rule -->\n")
+        registry = {"std": {"file": "doc.md", "section": "Std"}}
+        context_module.fetch_context("std", registry, tmp_path)
+        assert "Use uv." in capsys.readouterr().out
+
+
+# ---------------------------------------------------------------------------
+# Compact output
+# ---------------------------------------------------------------------------
+
+
+class TestCompactMarkdown:
+    def test_code_blocks_byte_exact(self, context_module):
+        code = "```python\n#   comment   \n\n\n| a  |  b |\n<!-- keep -->\n---\n```\n"
+        out = context_module.compact_markdown("Intro   \n\n\n" + code + "\n\n\nOutro\n")
+        assert code in out + "\n"
+        assert out.startswith("Intro\n\n```python")
+        assert out.endswith("```\n\nOutro")
+
+    def test_strips_decoration(self, context_module):
+        text = (
+            "## 🎯 Purpose <!-- CUSTOMIZE -->\n"
+            "---\n"
+            "Text <!-- inline --> here.\n"
+            "<!-- multi\nline\ncomment -->\n"
+            "\n\n\n"
+            "* * *\n"
+            "End.\n"
+        )
+        assert context_module.compact_markdown(text) == "## Purpose\nText  here.\n\nEnd."
+
+    def test_comment_hides_code_block(self, context_module):
+        text = "<!-- x\n```\ncode\n```\n-->\nafter"
+        assert context_module.compact_markdown(text) == "after"
+        text = "<!-- x\n```\n--> ```py\ncode\n```\nafter"
+        assert context_module.compact_markdown(text) == " ```py\ncode\n```\nafter"
+
+    def test_code_spans_keep_comment_markers(self, context_module):
+        text = "Use the `<!--` opener to start a note.\nNext line.\n"
+        assert context_module.compact_markdown(text) == text.strip("\n")
+        text = "customize the `<!-- CUSTOMIZE -->` sections <!-- gone -->\n"
+        expected = "customize the `<!-- CUSTOMIZE -->` sections"
+        assert context_module.compact_markdown(text) == expected
+
+    def test_indented_code_byte_exact(self, context_module):
+        code = "    # indented   code   keep\n\n    <!-- not a comment -->  \n"
+        out = context_module.compact_markdown("Intro\n\n" + code + "Outro\n")
+        assert out == "Intro\n\n" + code + "Outro"
+        # Four spaces after a paragraph line continue it; headings need 0-3 spaces
+        continued = "Text\n    # not heading"
+        assert context_module.compact_markdown(continued) == continued
+        assert context_module.compact_markdown("   ## 🎯 Goal  x") == "## Goal x"
+
+    def test_setext_underline_kept(self, context_module):
+        assert context_module.compact_markdown("Title\n---\ntext") == "Title\n---\ntext"
+        assert context_module.compact_markdown("Title\n\n---\ntext") == "Title\n\ntext"
+        assert context_module.compact_markdown("---\nTitle\n***\n") == "Title"
+
+    def test_tables_shrink_and_keep_alignment(self, context_module):
+        text = "| Name   | Value |\n| :--- | ---: |\n|  a\\|b  |  1  |\n"
+        assert context_module.compact_markdown(text) == "|Name|Value|\n|:-|-:|\n|a\\|b|1|"
+
+    def test_fetch_reports_savings(self, context_module, tmp_path, capsys):
+        (tmp_path / "doc.md").write_text("# Doc\n\n\n\n---\n| a    | b    |\n")
+        registry = {"k": "doc.md"}
+        result = context_module.fetch_context("k", registry, tmp_path, compact=True)
+        captured = capsys.readouterr()
+        assert "|a|b|" in captured.out
+        assert "--- Context: k ---" in captured.out
+        assert result["bytes"] == len(captured.out.encode("utf-8"))
+        assert result["raw_bytes"] > result["bytes"]
+        assert captured.err.startswith(f"Compact: {result['raw_bytes']} -> {result['bytes']}")
+        assert "tokens" in captured.err
+
+
+# ---------------------------------------------------------------------------
+# Usage telemetry and stats
+# ---------------------------------------------------------------------------
+
+
+class TestUsageTelemetry:
+    @pytest.fixture(autouse=True)
+    def _isolated_cache(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("CONTEXT_CACHE_DIR", str(tmp_path / "cache"))
+        monkeypatch.delenv("CONTEXT_TELEMETRY", raising=False)
+
+    def test_record_and_read_round_trip(self, context_module, tmp_path):
+        for ms in (1.0, 2.0):
+            context_module.record_usage(tmp_path, {"key": "k", "bytes": 10, "ms": ms})
+        records = context_module.read_usage(tmp_path)
+        assert [r["ms"] for r in records] == [1.0, 2.0]
+
+    def test_disabled_by_env(self, context_module, tmp_path, monkeypatch):
+        monkeypatch.setenv("CONTEXT_TELEMETRY", "0")
+        context_module.record_usage(tmp_path, {"key": "k"})
+        assert context_module.read_usage(tmp_path) == []
+
+    def test_rotation_keeps_previous_log(self, context_module, tmp_path, monkeypatch):
+        monkeypatch.setattr(context_module, "USAGE_LOG_MAX_BYTES", 50)
+        for i in range(6):
+            context_module.record_usage(tmp_path, {"key": f"k{i}", "bytes": 1, "ms": 0.1})
+        log_dir = tmp_path / "cache"
+        assert (log_dir / "usage.log.1").exists()
+        assert (log_dir / "usage.log").stat().st_size <= 100
+        keys = [r["key"] for r in context_module.read_usage(tmp_path)]
+        assert keys == sorted(keys) and keys[-1] == "k5"
+
+    def test_rotation_skipped_while_another_rotates(self, context_module, tmp_path, monkeypatch):
+        monkeypatch.setattr(context_module, "USAGE_LOG_MAX_BYTES", 10)
+        context_module.record_usage(tmp_path, {"key": "first"})
+        lock = tmp_path / "cache" / "usage.log.rotating"
+        lock.touch()
+        context_module.record_usage(tmp_path, {"key": "second"})
+        assert not (tmp_path / "cache" / "usage.log.1").exists()
+        os.utime(lock, (0, 0))  # a crashed rotator's lock is broken
+        context_module.record_usage(tmp_path, {"key": "third"})
+        context_module.record_usage(tmp_path, {"key": "fourth"})
+        assert not lock.exists()
+        assert [r["key"] for r in context_module.read_usage(tmp_path)] == [
+            "first",
+            "second",
+            "third",
+            "fourth",
+        ]
+        assert (tmp_path / "cache" / "usage.log.1").exists()
+
+    def test_usage_stats(self, context_module):
+        records = [{"key": "hot", "bytes": 100, "ms": float(ms)} for ms in range(1, 21)]
+        records.append({"key": "cold", "bytes": 5000, "ms": 3.0})
+        rows = {r["key"]: r for r in context_module.usage_stats(records)}
+        assert rows["hot"]["fetches"] == 20
+        assert rows["hot"]["bytes"] == 2000
+        assert rows["hot"]["p50"] == 10.0
+        assert rows["hot"]["p95"] == 19.0
+        assert rows["cold"]["avg_bytes"] == 5000
+
+    def test_print_stats_sorting(self, context_module, capsys):
+        records = [{"key": "a", "bytes": 1, "ms": 1.0}] * 3 + [{"key": "b", "bytes": 99, "ms": 1.0}]
+        context_module.print_stats(records, "bytes")
+        lines = capsys.readouterr().out.splitlines()
+        assert lines[1].startswith("b ")
+        assert lines[-1].startswith("Total: 4 fetches, 102 bytes across 2 keys")
+
+
+# ---------------------------------------------------------------------------
+# Sharded registries
+# ---------------------------------------------------------------------------
+
+
+def _record_loads(context_module, monkeypatch):
+    loaded = []
+    real = context_module.load_registry
+    monkeypatch.setattr(
+        context_module, "load_registry", lambda path: loaded.append(path.name) or real(path)
+    )
+    return loaded
+
+
+class TestRegistryShards:
+    def _project(self, tmp_path, monkeypatch):
+        """Main registry plus billing/adr shards; cache isolated under tmp_path."""
+        monkeypatch.setenv("CONTEXT_CACHE_DIR", str(tmp_path / "cache"))
+        shard_dir = tmp_path / "docs" / "context_registry.d"
+        shard_dir.mkdir(parents=True)
+        (tmp_path / "billing.md").write_text("## Invoices\nNet 30.\n")
+        (shard_dir / "billing.json").write_text(
+            json.dumps(
+                {
+                    "billing:invoices": {"file": "billing.md", "section": "Invoices"},
+                    "adr:misrouted": "billing.md",
+                }
+            )
+        )
+        (shard_dir / "adr.json").write_text(json.dumps({"adr:0001": "billing.md"}))
+        registry = {"_meta": {"protocol_version": "1.0.0"}, "protocol:init": "PROTOCOL.md"}
+        return registry
+
+    def test_fetch_parses_only_routed_shard(self, context_module, monkeypatch, tmp_path):
+        registry = self._project(tmp_path, monkeypatch)
+        loaded = _record_loads(context_module, monkeypatch)
+        merged = context_module.load_registry_for_key(registry, tmp_path, "billing:invoices")
+        assert loaded == ["billing.json"]
+        assert "billing:invoices" in merged
+        assert "adr:misrouted" not in merged
+
+    def test_unsharded_key_parses_nothing(self, context_module, monkeypatch, tmp_path):
+        registry = self._project(tmp_path, monkeypatch)
+        loaded = _record_loads(context_module, monkeypatch)
+        assert context_module.load_registry_for_key(registry, tmp_path, "protocol:init") is registry
+        assert context_module.load_registry_for_key(registry, tmp_path, "../x:y") is registry
+        assert loaded == []
+
+    def test_list_uses_cached_index(self, context_module, monkeypatch, tmp_path):
+        registry = self._project(tmp_path, monkeypatch)
+        first = context_module.list_keys(registry, tmp_path)
+        assert first == ["protocol:init", "adr:0001", "billing:invoices"]
+        loaded = _record_loads(context_module, monkeypatch)
+        assert context_module.list_keys(registry, tmp_path) == first
+        assert loaded == []
+
+    def test_index_reparses_changed_shard_only(self, context_module, monkeypatch, tmp_path):
+        registry = self._project(tmp_path, monkeypatch)
+        context_module.list_keys(registry, tmp_path)
+        shard = tmp_path / "docs" / "context_registry.d" / "adr.json"
+        shard.write_text(json.dumps({"adr:0001": "a.md", "adr:0002": "b.md"}))
+        loaded = _record_loads(context_module, monkeypatch)
+        keys = context_module.list_keys(registry, tmp_path)
+        assert loaded == ["adr.json"]
+        assert "adr:0002" in keys
+
+    def test_full_registry_merges_all_shards(self, context_module, tmp_path, monkeypatch):
+        registry = self._project(tmp_path, monkeypatch)
+        full = context_module.load_full_registry(registry, tmp_path)
+        assert {"protocol:init", "adr:0001", "billing:invoices"} <= full.keys()
+
+
+# ---------------------------------------------------------------------------
+# suggest (TF-IDF key ranking)
+# ---------------------------------------------------------------------------
+
+
+class TestGetCacheDir:
+    def test_env_override(self, context_module, tmp_path, monkeypatch):
+        monkeypatch.setenv("CONTEXT_CACHE_DIR", str(tmp_path / "c"))
+        assert context_module.get_cache_dir(tmp_path) == tmp_path / "c"
+
+    def test_git_dir(self, context_module, tmp_path, monkeypatch):
+        monkeypatch.delenv("CONTEXT_CACHE_DIR", raising=False)
+        (tmp_path / ".git").mkdir()
+        assert context_module.get_cache_dir(tmp_path) == tmp_path / ".git" / "context_cache"
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="POSIX permissions")
+    def test_no_git_dir_uses_private_user_cache(self, context_module, tmp_path, monkeypatch):
+        monkeypatch.delenv("CONTEXT_CACHE_DIR", raising=False)
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
+        monkeypatch.setattr(context_module, "_private_dirs", {})
+        cache_dir = context_module.get_cache_dir(tmp_path / "project")
+        assert (tmp_path / "xdg" / "ai-protocol" / "context_cache") in cache_dir.parents
+        assert cache_dir.stat().st_mode & 0o777 == 0o700
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="POSIX ownership")
+    def test_foreign_cache_dir_not_trusted(self, context_module, tmp_path, monkeypatch):
+        monkeypatch.delenv("CONTEXT_CACHE_DIR", raising=False)
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "xdg"))
+        monkeypatch.setattr(context_module, "_private_dirs", {})
+        owner = os.getuid()
+        monkeypatch.setattr(context_module.os, "getuid", lambda: owner + 1)
+        cache_dir = context_module.get_cache_dir(tmp_path / "project")
+        assert tmp_path / "xdg" not in cache_dir.parents
+        assert cache_dir.name.startswith("context_cache-")
+        cache_dir.rmdir()
+
+    def test_linked_worktree(self, context_module, worktree_pair, monkeypatch):
+        monkeypatch.delenv("CONTEXT_CACHE_DIR", raising=False)
+        main, linked = worktree_pair
+        common = (main / ".git").resolve()
+        assert context_module.git_dirs(linked) == (common / "worktrees" / "linked", common)
+        assert context_module.get_cache_dir(linked).parent == common / "worktrees" / "linked"
+        shared = context_module.section_cache_dir
+        assert shared(linked) == shared(main) == common / "context_cache" / "sections"
+
+
+class TestSuggest:
+    def _project(self, tmp_path, monkeypatch):
+        """Small project with distinct docs per key; cache isolated under tmp_path."""
+        monkeypatch.setenv("CONTEXT_CACHE_DIR", str(tmp_path / "cache"))
+        (tmp_path / "testing.md").write_text(
+            "## Tests\nRun pytest with fixtures and coverage for every unit test.\n"
+        )
+        (tmp_path / "branching.md").write_text(
+            "## Branches\nCreate a feature branch; name it with a timestamp before commits.\n"
+        )
+        (tmp_path / "safety.md").write_text("Ask before running shell commands. Stop on error.\n")
+        registry = {
+            "_meta": {"protocol_version": "1.0.0"},
+            "protocol:testing": {"file": "testing.md", "section": "Tests"},
+            "protocol:branching": {"file": "branching.md", "section": "Branches"},
+            "protocol:safety": "safety.md",
+        }
+        return registry
+
+    def test_ranks_relevant_key_first(self, context_module, tmp_path, monkeypatch):
+        registry = self._project(tmp_path, monkeypatch)
+        index = context_module.load_suggest_index(registry, tmp_path)
+        ranked = context_module.rank_keys(index, "add pytest coverage for the parser")
+        assert ranked[0][0] == "protocol:testing"
+        assert 0 < ranked[0][1] <= 1.0
+
+    def test_key_names_are_searchable(self, context_module, tmp_path, monkeypatch):
+        registry = self._project(tmp_path, monkeypatch)
+        index = context_module.load_suggest_index(registry, tmp_path)
+        assert context_module.rank_keys(index, "branching")[0][0] == "protocol:branching"
+
+    def test_unknown_terms_return_nothing(self, context_module, tmp_path, monkeypatch):
+        registry = self._project(tmp_path, monkeypatch)
+        index = context_module.load_suggest_index(registry, tmp_path)
+        assert context_module.rank_keys(index, "zzz qqq") == []
+
+    def test_top_k_limits_results(self, context_module, tmp_path, monkeypatch):
+        registry = self._project(tmp_path, monkeypatch)
+        index = context_module.load_suggest_index(registry, tmp_path)
+        assert len(context_module.rank_keys(index, "branch commands tests", top_k=1)) == 1
+
+    def test_pure_python_matches_numpy(self, context_module, monkeypatch, tmp_path):
+        pytest.importorskip("numpy")
+        registry = self._project(tmp_path, monkeypatch)
+        index = context_module.load_suggest_index(registry, tmp_path)
+        query = "branch tests before shell commands"
+        vectorized = context_module.rank_keys(index, query, top_k=3)
+        monkeypatch.setattr(context_module, "np", None)
+        fallback = context_module.rank_keys(index, query, top_k=3)
+        assert [k for k, _ in fallback] == [k for k, _ in vectorized]
+        for (_, a), (_, b) in zip(fallback, vectorized):
+            assert a == pytest.approx(b)
+
+    def test_index_cached_until_sources_change(self, context_module, monkeypatch, tmp_path):
+        registry = self._project(tmp_path, monkeypatch)
+        context_module.load_suggest_index(registry, tmp_path)
+        builds = []
+        real = context_module.build_suggest_index
+        monkeypatch.setattr(
+            context_module,
+            "build_suggest_index",
+            lambda *a: builds.append(1) or real(*a),
+        )
+        context_module.load_suggest_index(registry, tmp_path)
+        assert builds == []
+        (tmp_path / "safety.md").write_text("Deployment rollback runbook.\n")
+        index = context_module.load_suggest_index(registry, tmp_path)
+        assert builds == [1]
+        assert context_module.rank_keys(index, "rollback")[0][0] == "protocol:safety"
+
+    def test_texts_match_fetched_sections(self, context_module, monkeypatch, tmp_path):
+        """Suggest indexes exactly what fetch would return for each section."""
+        registry = self._project(tmp_path, monkeypatch)
+        (tmp_path / "testing.md").write_text(
+            "## Tests\nUnit.\n```\n## Fenced\n```\n### Sub\nNested.\n## Other\nLater.\n"
+        )
+        texts = context_module.registry_texts(registry, tmp_path)
+        expected = context_module.extract_section(tmp_path / "testing.md", "Tests")
+        assert texts["protocol:testing"] == expected
+        assert "Nested." in expected and "Later." not in expected
+
+
+# ---------------------------------------------------------------------------
+# Historical fetch (--rev)
+# ---------------------------------------------------------------------------
+
+
+def _git(cwd, *args):
+    subprocess.run(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@t", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+    )
+
+
+@pytest.fixture
+def history_project(tmp_path, monkeypatch):
+    """Repo whose first commit says 'old rule' and working tree says 'new rule'."""
+    monkeypatch.setenv("CONTEXT_CACHE_DIR", str(tmp_path / "cache"))
+    repo = tmp_path / "repo"
+    (repo / "docs" / "context_registry.d").mkdir(parents=True)
+    registry = {"_meta": {}, "rules": {"file": "rules.md", "section": "Rules"}}
+    (repo / "docs" / "context_registry.json").write_text(json.dumps(registry))
+    (repo / "docs" / "context_registry.d" / "adr.json").write_text(
+        json.dumps({"adr:1": "adr1.md"})
+    )
+    (repo / "adr1.md").write_text("ADR one.\n<!-- include: shared.md -->\n")
+    (repo / "shared.md").write_text("Shared v1.\n")
+    (repo / "rules.md").write_text("## Rules\nold rule\n## Next\n")
+    _git(repo, "init", "-q")
+    _git(repo, "add", ".")
+    _git(repo, "commit", "-q", "-m", "v1")
+    (repo / "rules.md").write_text("## Rules\nnew rule\n")
+    (repo / "shared.md").write_text("Shared v2.\n")
+    return repo
+
+
+class TestGitBlobReader:
+    def test_reads_files_at_rev(self, context_module, history_project):
+        git = context_module.GitBlobReader(history_project, "HEAD")
+        try:
+            assert "old rule" in git.read_text("rules.md")
+            assert git.read_text("./rules.md") == git.read_text("rules.md")
+            assert git.read_text("missing.md") is None
+            assert git.read_text("docs") is None  # a tree, not a blob
+            assert "Shared v1." in git.read_text("shared.md")
+        finally:
+            git.close()
+
+    def test_unknown_rev(self, context_module, history_project):
+        with pytest.raises(ValueError):
+            context_module.GitBlobReader(history_project, "no-such-rev")
+
+    def test_fetch_at_rev_uses_one_process(
+        self, context_module, history_project, capsys, monkeypatch
+    ):
+        spawned = []
+        real_popen = subprocess.Popen
+        monkeypatch.setattr(
+            context_module.subprocess,
+            "Popen",
+            lambda *a, **kw: spawned.append(a[0]) or real_popen(*a, **kw),
+        )
+        opts = {"key": "adr:1", "rev": "HEAD", "compact": False, "format": "text"}
+        context_module.fetch_at_rev(opts, history_project)
+        out = capsys.readouterr().out
+        assert "--- Context: adr:1 @ HEAD ---" in out
+        assert "ADR one." in out
+        assert "Shared v1." in out  # the include is read at the revision too
+        assert [cmd[1] for cmd in spawned].count("cat-file") == 1
+
+    def test_parse_fetch_args(self, context_module):
+        parse = context_module.parse_fetch_args
+        assert parse(["--rev", "abc", "--compact", "k"]) == {
+            "key": "k",
+            "compact": True,
+            "rev": "abc",
+            "format": "text",
+        }
+        assert parse(["--format", "ndjson", "k"])["format"] == "ndjson"
+        assert parse(["--format", "xml", "k"]) is None
+        assert parse(["k", "extra"]) is None
+        assert parse(["--rev"]) is None
+        assert parse(["--bogus", "k"]) is None
+
+
+# ---------------------------------------------------------------------------
+# Shared section cache (blob-keyed, cross-worktree)
+# ---------------------------------------------------------------------------
+
+
+@pytest.fixture
+def worktree_pair(tmp_path):
+    """A committed repo and a linked worktree of it: (main, linked)."""
+    main = tmp_path / "main"
+    (main / "docs").mkdir(parents=True)
+    registry = {"_meta": {}, "std": {"file": "docs/std.md", "section": "Errors"}}
+    (main / "docs" / "context_registry.json").write_text(json.dumps(registry))
+    (main / "docs" / "std.md").write_text("# Std\n## Errors\nRaise early.\n## Next\n")
+    _git(main, "init", "-q")
+    _git(main, "add", ".")
+    _git(main, "commit", "-q", "-m", "init")
+    linked = tmp_path / "linked"
+    _git(main, "worktree", "add", "-q", "--detach", str(linked))
+    return main, linked
+
+
+def _count_parses(context_module, monkeypatch):
+    calls = []
+    real = context_module.locate_section
+    monkeypatch.setattr(context_module, "locate_section", lambda *a: calls.append(a[1]) or real(*a))
+    return calls
+
+
+class TestSectionCache:
+    def test_file_blob_id_matches_git(self, context_module, worktree_pair):
+        main, _ = worktree_pair
+        expected = subprocess.run(
+            ["git", "hash-object", "docs/std.md"], cwd=main, capture_output=True, text=True
+        ).stdout.strip()
+        with open(main / "docs" / "std.md", "rb") as f:
+            assert context_module.file_blob_id(f) == expected
+
+    def test_parse_shared_across_worktrees(
+        self, context_module, worktree_pair, monkeypatch, capsys
+    ):
+        monkeypatch.delenv("CONTEXT_CACHE_DIR", raising=False)
+        monkeypatch.setenv("CONTEXT_TELEMETRY", "0")
+        main, linked = worktree_pair
+        registry = json.loads((main / "docs" / "context_registry.json").read_text())
+        parses = _count_parses(context_module, monkeypatch)
+        context_module.fetch_context("std", registry, main)
+        assert parses == ["Errors"]
+        context_module.fetch_context("std", registry, linked)
+        assert parses == ["Errors"]  # served from the common dir
+        assert capsys.readouterr().out.count("Raise early.") == 2
+        # A --rev read of the same blob hits too
+        git = context_module.GitBlobReader(linked, "HEAD")
+        try:
+            context_module.fetch_context("std", registry, linked, git=git)
+        finally:
+            git.close()
+        assert parses == ["Errors"]
+
+    def test_changed_content_misses(self, context_module, worktree_pair, monkeypatch, capsys):
+        monkeypatch.delenv("CONTEXT_CACHE_DIR", raising=False)
+        main, linked = worktree_pair
+        registry = json.loads((main / "docs" / "context_registry.json").read_text())
+        context_module.fetch_context("std", registry, main)
+        (linked / "docs" / "std.md").write_text("## Errors\nReturn results.\n")
+        parses = _count_parses(context_module, monkeypatch)
+        context_module.fetch_context("std", registry, linked)
+        assert parses == ["Errors"]
+        out = capsys.readouterr().out
+        assert "Return results." in out
+
+    def test_unreadable_entry_is_a_miss(self, context_module, tmp_path, monkeypatch):
+        monkeypatch.setenv("CONTEXT_CACHE_DIR", str(tmp_path / "cache"))
+        cache = context_module.SectionCache(tmp_path)
+        data = b"## A\nx\n"
+        cache.store("ab" * 20, "A", (2, 0, 7, "## A\nx"))
+        assert cache.locate_blob("ab" * 20, data, "A") == (2, 0, 7, "## A\nx")
+        cache._path("cd" * 20, "A").parent.mkdir(parents=True, exist_ok=True)
+        cache._path("cd" * 20, "A").write_text('{"found": [2, 0')  # torn write
+        assert cache.locate_blob("cd" * 20, data, "A") == (2, 0, 7, "## A\nx")
+        assert cache.lookup("cd" * 20, "A") == {"found": [2, 0, 7, "## A\nx"]}
+        assert cache.locate_blob("ef" * 20, data, "Absent") is None
+        assert cache.lookup("ef" * 20, "Absent") == {"found": None}
+        assert list((tmp_path / "cache").rglob(".tmp-*")) == []
+
+    def test_lone_cr_splits_alike_for_blob_and_file(self, context_module, tmp_path, monkeypatch):
+        monkeypatch.setenv("CONTEXT_CACHE_DIR", str(tmp_path / "cache"))
+        data = b"intro\r## Target\nbody\n"
+        (tmp_path / "doc.md").write_bytes(data)
+        with open(tmp_path / "doc.md", "rb") as f:
+            oid = context_module.file_blob_id(f)
+            f.seek(0)
+            assert context_module.locate_section(f, "Target") is None  # no line starts "##"
+        cache = context_module.SectionCache(tmp_path)
+        assert cache.locate_many(oid, data, ["Target"]) == {"Target": None}  # prefetch
+        with open(tmp_path / "doc.md", "rb") as f:
+            assert cache.locate_file(f, "Target") is None
+
+    def test_generation_tracks_parser_limits(self, context_module, tmp_path, monkeypatch):
+        monkeypatch.setenv("CONTEXT_CACHE_DIR", str(tmp_path / "cache"))
+        cache = context_module.SectionCache(tmp_path)
+        cache.store("ab" * 20, "A", None)
+        generation = cache._path("ab" * 20, "A").parent.parent
+        assert generation.parent == tmp_path / "cache" / "sections"
+        assert generation.name.startswith(f"v{context_module.SECTION_CACHE_FORMAT}-")
+        monkeypatch.setattr(context_module, "MAX_SECTION_CHARS", 1024)
+        assert context_module.SectionCache(tmp_path).lookup("ab" * 20, "A") is None
+
+    def test_idle_generations_pruned(self, context_module, tmp_path, monkeypatch):
+        monkeypatch.setenv("CONTEXT_CACHE_DIR", str(tmp_path / "cache"))
+        base = tmp_path / "cache" / "sections"
+        old, recent = base / "v0-old", base / "v0-recent"
+        for gen in (old, recent):
+            (gen / "ab").mkdir(parents=True)
+        week_ago = time.time() - 7 * 24 * 3600
+        os.utime(old, (0, 0))
+        os.utime(recent, (week_ago, week_ago))
+        context_module.SectionCache(tmp_path)
+        assert not old.exists()
+        assert recent.exists()  # another protocol version may still be using it
+
+
+# ---------------------------------------------------------------------------
+# Branch-aware prefetch
+# ---------------------------------------------------------------------------
+
+PREFETCH_META = {
+    "prefetch": {
+        "feature": ["std", "testing"],
+        "hotfix": ["testing", "missing"],
+        "default": ["std"],
+    }
+}
+
+
+def _prefetch_project(tmp_path, monkeypatch):
+    """Write std/testing keys with a prefetch map under tmp_path; returns the registry."""
+    monkeypatch.setenv("CONTEXT_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("CONTEXT_TELEMETRY", "0")
+    (tmp_path / "docs").mkdir()
+    registry = {
+        "_meta": PREFETCH_META,
+        "std": [{"file": "docs/std.md", "section": "Errors"}, "docs/shared.md"],
+        "testing": {"file": "docs/std.md", "section": "Tests"},
+    }
+    (tmp_path / "docs" / "context_registry.json").write_text(json.dumps(registry))
+    (tmp_path / "docs" / "std.md").write_text(
+        "## Errors\nRaise early.\n<!-- include: docs/shared.md -->\n## Tests\nUse pytest.\n"
+    )
+    (tmp_path / "docs" / "shared.md").write_text("Shared rule.\n")
+    return registry
+
+
+class TestPrefetch:
+    def test_prefetch_keys_by_branch_type(self, context_module):
+        registry = {"_meta": PREFETCH_META}
+        keys = context_module.prefetch_keys
+        assert keys(registry, "feature/20240101-120000-login") == ("feature", ["std", "testing"])
+        assert keys(registry, "chore/20240101-120000-deps") == ("chore", ["std"])
+        assert keys(registry, "main") == ("default", ["std"])
+        assert keys({"_meta": {}}, "feature/x") == ("feature", [])
+
+    def test_warms_every_section_in_one_pass(self, context_module, capsys, tmp_path, monkeypatch):
+        registry = _prefetch_project(tmp_path, monkeypatch)
+        result = context_module.prefetch(registry, tmp_path, ["std", "testing", "missing"])
+        assert result == {"keys": 2, "files": 2, "sections": 3, "parsed": 2}
+        assert "prefetch key not found: missing" in capsys.readouterr().err
+        # A second pass finds everything cached
+        assert context_module.prefetch(registry, tmp_path, ["std", "testing"])["parsed"] == 0
+
+    def test_fetch_after_prefetch_is_warm(self, context_module, monkeypatch, capsys, tmp_path):
+        registry = _prefetch_project(tmp_path, monkeypatch)
+        context_module.prefetch(registry, tmp_path, ["std", "testing"])
+        parses = _count_parses(context_module, monkeypatch)
+        resolved = []
+        real_resolve = context_module.IncludeResolver.resolve
+
+        def resolve(self, node, stack):
+            resolved.append(self._cached(node))
+            return real_resolve(self, node, stack)
+
+        monkeypatch.setattr(context_module.IncludeResolver, "resolve", resolve)
+        context_module.fetch_context("std", registry, tmp_path)
+        assert parses == []
+        assert resolved and all(hit is not None for hit in resolved)  # includes cached too
+        assert "Shared rule." in capsys.readouterr().out
+
+
+# ---------------------------------------------------------------------------
+# Context cost report (sizes)
+# ---------------------------------------------------------------------------
+
+
+def _sizes_project(tmp_path, monkeypatch):
+    """Write overlapping guide.md keys and a budget under tmp_path; returns the registry."""
+    monkeypatch.setenv("CONTEXT_CACHE_DIR", str(tmp_path / "cache"))
+    (tmp_path / "docs").mkdir()
+    registry = {
+        "_meta": {"budgets": {"key_tokens": 10}},
+        "all": "docs/guide.md",
+        "part": {"file": "docs/guide.md", "section": "Part"},
+        "sub": {"file": "docs/guide.md", "section": "Sub"},
+        "other": [{"file": "docs/guide.md", "section": "Other"}, "docs/gone.md"],
+    }
+    (tmp_path / "docs" / "context_registry.json").write_text(json.dumps(registry))
+    (tmp_path / "docs" / "guide.md").write_text(
+        "## Part\nalpha\n### Sub\nbeta\n## Other\ngamma\n"
+    )
+    return registry
+
+
+class TestSizes:
+    def test_key_sizes(self, context_module, tmp_path, monkeypatch):
+        registry = _sizes_project(tmp_path, monkeypatch)
+        rows, overlaps = context_module.key_sizes(registry, tmp_path)
+        by_key = {r["key"]: r for r in rows}
+        assert by_key["sub"] == {
+            "key": "sub",
+            "entries": 1,
+            "missing": 0,
+            "lines": 2,
+            "bytes": len("### Sub\nbeta"),
+            "tokens": 3,
+        }
+        assert by_key["all"]["bytes"] == len("## Part\nalpha\n### Sub\nbeta\n## Other\ngamma\n")
+        assert by_key["other"]["missing"] == 1
+        pairs = {tuple(sorted(o["keys"])): o["bytes"] for o in overlaps}
+        assert pairs == {
+            ("all", "part"): len("## Part\nalpha\n### Sub\nbeta\n"),
+            ("all", "sub"): len("### Sub\nbeta\n"),
+            ("part", "sub"): len("### Sub\nbeta\n"),
+            ("all", "other"): len("## Other\ngamma\n"),
+        }
+
+    def test_parse_sizes_args(self, context_module):
+        parse = context_module.parse_sizes_args
+        meta = {"_meta": {"budgets": {"key_tokens": 50, "total_tokens": 900}}}
+        assert parse([], {}) == {"key_tokens": 4000, "total_tokens": None, "check": False}
+        assert parse([], meta) == {"key_tokens": 50, "total_tokens": 900, "check": False}
+        assert parse(["--max-key-tokens", "7", "--check"], meta) == {
+            "key_tokens": 7,
+            "total_tokens": 900,
+            "check": True,
+        }
+        assert parse(["--max-key-tokens", "lots"], {}) is None
+        assert parse(["--bogus"], {}) is None
+
+    def test_print_sizes_reports_violations(self, context_module, capsys, tmp_path, monkeypatch):
+        registry = _sizes_project(tmp_path, monkeypatch)
+        rows, overlaps = context_module.key_sizes(registry, tmp_path)
+        violations = context_module.print_sizes(rows, overlaps, 10, 20)
+        out = capsys.readouterr().out
+        assert out.splitlines()[1].startswith("all ")  # largest first
+        assert "OVERSIZED (> 10 tokens)" in out
+        assert "1 missing" in out
+        assert "all / sub in docs/guide.md" in out
+        assert violations[0].startswith("all: ~")
+        assert violations[-1].startswith("total: ~")
+
+
+# ---------------------------------------------------------------------------
+# Structured fetch (--format json|ndjson)
+# ---------------------------------------------------------------------------
+
+
+class TestStructuredFetch:
+    DOC = "# Doc\nIntro é.\n\n## Target\nBody ü.\n### Child\nMore.\n## Next\nAfter.\n"
+
+    def _project(self, tmp_path, monkeypatch, registry):
+        monkeypatch.setenv("CONTEXT_CACHE_DIR", str(tmp_path / "cache"))
+        (tmp_path / "doc.md").write_text(self.DOC, encoding="utf-8")
+        return registry
+
+    def test_locate_section_byte_span(self, context_module):
+        data = self.DOC.encode("utf-8")
+        level, start, end, text = context_module.locate_section(
+            data.splitlines(keepends=True), "Target"
+        )
+        assert level == 2
+        assert data[start:end].decode("utf-8") == "## Target\nBody ü.\n### Child\nMore.\n"
+        assert text == "## Target\nBody ü.\n### Child\nMore."
+        # str lines give the same UTF-8 offsets
+        assert context_module.locate_section(self.DOC.splitlines(True), "Target")[1:3] == (
+            start,
+            end,
+        )
+        assert context_module.locate_section([b"# A\n"], "Absent") is None
+
+    def test_locate_section_crlf(self, context_module):
+        data = b"# A\r\nx\r\n# B\r\n"
+        level, start, end, text = context_module.locate_section(data.splitlines(True), "A")
+        assert (level, start, end, text) == (1, 0, 8, "# A\nx")
+
+    def test_ndjson_records(self, context_module, tmp_path, monkeypatch, capsys):
+        registry = self._project(
+            tmp_path,
+            monkeypatch,
+            {"k": [{"file": "doc.md", "section": "Target"}, "doc.md", "gone.md"]},
+        )
+        result = context_module.stream_records("k", registry, tmp_path, "ndjson")
+        out = capsys.readouterr().out
+        records = [json.loads(line) for line in out.splitlines()]
+        assert result == {"bytes": len(out.encode("utf-8")), "sections": 3}
+        section, whole, missing = records
+        data = (tmp_path / "doc.md").read_bytes()
+        assert section["key"] == "k" and section["status"] == "ok" and section["level"] == 2
+        assert data[section["start"] : section["end"]].startswith(b"## Target")
+        expected = hashlib.sha256(section["text"].encode("utf-8")).hexdigest()
+        assert section["sha256"] == expected
+        assert (whole["level"], whole["start"], whole["end"]) == (None, 0, len(data))
+        assert whole["section"] is None and whole["text"] == self.DOC
+        assert missing["status"] == "missing_file" and "text" not in missing
+        assert section["expanded"] is False and whole["expanded"] is False
+
+    def test_expanded_text_keeps_source_offsets(
+        self, context_module, tmp_path, monkeypatch, capsys
+    ):
+        registry = self._project(tmp_path, monkeypatch, {"k": ["inc.md"], "c": ["doc.md"]})
+        source = "Intro\n<!-- include: shared.md -->\n"
+        (tmp_path / "inc.md").write_text(source)
+        (tmp_path / "shared.md").write_text("Shared.\n")
+        context_module.stream_records("k", registry, tmp_path, "ndjson")
+        context_module.stream_records("c", registry, tmp_path, "ndjson", compact=True)
+        included, compacted = map(json.loads, capsys.readouterr().out.splitlines())
+        assert included["expanded"] is True
+        assert (included["start"], included["end"]) == (0, len(source))
+        assert included["text"] == "Intro\nShared.\n"
+        assert compacted["expanded"] is True  # --compact rewrote the span
+
+    def test_json_envelope(self, context_module, tmp_path, monkeypatch, capsys):
+        registry = self._project(
+            tmp_path, monkeypatch, {"k": [{"file": "doc.md", "section": "Nope"}, "doc.md"]}
+        )
+        context_module.stream_records("k", registry, tmp_path, "json")
+        doc = json.loads(capsys.readouterr().out)
+        assert doc["key"] == "k" and doc["rev"] is None
+        assert [r["status"] for r in doc["entries"]] == ["not_found", "ok"]
+        assert doc["entries"][0]["error"] == "Section not found."
+
+    def test_unknown_key_is_a_record(self, context_module, tmp_path, monkeypatch, capsys):
+        registry = self._project(tmp_path, monkeypatch, {"_meta": {}})
+        with pytest.raises(SystemExit):
+            context_module.stream_records("_meta", registry, tmp_path, "json")
+        record = json.loads(capsys.readouterr().out)
+        assert record == {"key": "_meta", "rev": None, "status": "error", "error": "Key not found."}
+
+    def test_records_written_incrementally(self, context_module, tmp_path, monkeypatch):
+        registry = self._project(tmp_path, monkeypatch, {"k": ["doc.md", "doc.md"]})
+        writes = []
+        monkeypatch.setattr(context_module.sys.stdout, "write", writes.append)
+        context_module.stream_records("k", registry, tmp_path, "json")
+        assert len(writes) == 4  # envelope, two records, closing brackets
+
+
+# ---------------------------------------------------------------------------
+# Requirements index
+# ---------------------------------------------------------------------------
+
+REQ_DOC = """# Requirement: Login
+
+**Branch:** `feature/20240101-120000-login`
+
+## 2. Acceptance Criteria
+- [ ] Not a checklist item
+
+## 3. Implementation Checklist
+
+> Notes are dropped.
+
+### Core
+- [x] **Data:** done
+- [ ] **Logic:** todo
+
+### QA
+- [X] **Tests:** done
+
+## 4. Dependencies
+- [ ] Not a checklist item either
+"""
+
+
+def _requirements_project(tmp_path, monkeypatch):
+    """Write login/search requirements plus the template under tmp_path."""
+    monkeypatch.setenv("CONTEXT_CACHE_DIR", str(tmp_path / "cache"))
+    req_dir = tmp_path / "docs" / "requirements"
+    req_dir.mkdir(parents=True)
+    (tmp_path / "docs" / "context_registry.json").write_text('{"_meta": {}}')
+    (req_dir / "TEMPLATE.md").write_text("**Branch:** `[branch-type]/x`\n")
+    (req_dir / "login.md").write_text(REQ_DOC)
+    (req_dir / "search.md").write_text("# Search\n## Implementation Checklist\n- [ ] a\n")
+
+
+class TestRequirements:
+    def test_parse_requirement(self, context_module):
+        doc = context_module.parse_requirement(REQ_DOC.splitlines(keepends=True))
+        assert doc == {
+            "branch": "feature/20240101-120000-login",
+            "checklist": [
+                "### Core",
+                "- [x] **Data:** done",
+                "- [ ] **Logic:** todo",
+                "### QA",
+                "- [X] **Tests:** done",
+            ],
+            "done": 2,
+            "total": 3,
+        }
+
+    def test_index_skips_template(self, context_module, tmp_path, monkeypatch):
+        _requirements_project(tmp_path, monkeypatch)
+        index = context_module.requirements_index(tmp_path)
+        assert sorted(index) == ["docs/requirements/login.md", "docs/requirements/search.md"]
+
+    def test_index_reparses_only_changed_files(self, context_module, monkeypatch, tmp_path):
+        _requirements_project(tmp_path, monkeypatch)
+        context_module.requirements_index(tmp_path)
+        (tmp_path / "docs" / "requirements" / "search.md").write_text(
+            "**Branch:** `fix/search`\n## Implementation Checklist\n- [x] a\n"
+        )
+        parsed = []
+        real = context_module.parse_requirement
+        monkeypatch.setattr(
+            context_module, "parse_requirement", lambda lines: parsed.append(1) or real(lines)
+        )
+        index = context_module.requirements_index(tmp_path)
+        assert len(parsed) == 1
+        assert index["docs/requirements/search.md"]["branch"] == "fix/search"
+        assert index["docs/requirements/search.md"]["done"] == 1
+
+    def test_find_requirements(self, context_module, tmp_path, monkeypatch):
+        _requirements_project(tmp_path, monkeypatch)
+        index = context_module.requirements_index(tmp_path)
+        find = context_module.find_requirements
+        assert find(index, "feature/20240101-120000-login") == ["docs/requirements/login.md"]
+        assert find(index, "feature/20240202-090000-search") == ["docs/requirements/search.md"]
+        assert find(index, "main") == []
+
+
+# ---------------------------------------------------------------------------
+# PROGRESS.md archive
+# ---------------------------------------------------------------------------
+
+PROGRESS_DOC = """# Project Progress Report
+
+## Active Tasks
+
+- [ ] Build search
+- [x] **2024-03-02:** Fix login redirect
+  - follow-up noted in PR #12
+
+## Completed Tasks
+
+> Finished work.
+
+- [x] **2024-01-05:** Project initialized — *Branch: main*
+- [x] **2024-02-10:** Add OAuth login — *Branch: feature/oauth*
+
+```
+- [x] not an entry inside a code block
+```
+
+## Upcoming / Backlog
+- [x] Backlog items are left alone
+"""
+
+
+def _progress_project(tmp_path, monkeypatch):
+    """Write a registry and PROGRESS_DOC as docs/PROGRESS.md under tmp_path."""
+    monkeypatch.setenv("CONTEXT_CACHE_DIR", str(tmp_path / "cache"))
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "context_registry.json").write_text('{"_meta": {}}')
+    (tmp_path / "docs" / "PROGRESS.md").write_text(PROGRESS_DOC, encoding="utf-8")
+
+
+class TestProgressArchive:
+    def test_split_completed(self, context_module):
+        kept, entries = context_module.split_completed(PROGRESS_DOC.splitlines(keepends=True))
+        assert [(e["section"], e["date"]) for e in entries] == [
+            ("Active Tasks", "2024-03-02"),
+            ("Completed Tasks", "2024-01-05"),
+            ("Completed Tasks", "2024-02-10"),
+        ]
+        assert entries[0]["text"].endswith("  - follow-up noted in PR #12")
+        hot = "".join(kept)
+        assert "- [ ] Build search" in hot
+        assert "- [x] not an entry inside a code block" in hot
+        assert "- [x] Backlog items are left alone" in hot
+        assert "OAuth" not in hot and "follow-up" not in hot
+
+    def test_archive_and_search(self, context_module, tmp_path, monkeypatch):
+        _progress_project(tmp_path, monkeypatch)
+        assert context_module.archive_progress(tmp_path) == 3
+        assert context_module.archive_progress(tmp_path) == 0
+        progress = tmp_path / "docs" / "PROGRESS.md"
+        progress.write_text(progress.read_text().replace("- [ ] Build", "- [x] Build"))
+        assert context_module.archive_progress(tmp_path) == 1
+        archive = tmp_path / "docs" / "PROGRESS.archive.jsonl.gz"
+        with gzip.open(archive, "rt", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+        assert len(records) == 4
+        search = context_module.search_archive
+        assert [r["date"] for r in search(tmp_path, "login")] == [
+            "2024-03-02",
+            "2024-02-10",
+        ]
+        assert [r["text"] for r in search(tmp_path, "search")] == ["- [x] Build search"]
+        assert len(search(tmp_path, "")) == 4
+        assert search(tmp_path, "nothing-matches") == []
+
+    def test_search_reads_only_matching_members(self, context_module, monkeypatch, tmp_path):
+        _progress_project(tmp_path, monkeypatch)
+        context_module.archive_progress(tmp_path)
+        progress = tmp_path / "docs" / "PROGRESS.md"
+        progress.write_text(progress.read_text().replace("- [ ] Build", "- [x] Build"))
+        context_module.archive_progress(tmp_path)
+        context_module.progress_index(tmp_path)  # warm the index
+        read = []
+        real = context_module.read_archive_member
+        monkeypatch.setattr(
+            context_module,
+            "read_archive_member",
+            lambda f, offset: read.append(offset) or real(f, offset),
+        )
+        assert len(context_module.search_archive(tmp_path, "build")) == 1
+        assert read != [0]  # only the second member is decompressed
+        assert len(read) == 1
+
+
+# ---------------------------------------------------------------------------
+# Scripts catalog index
+# ---------------------------------------------------------------------------
+
+CATALOG_DOC = """# Scripts Catalog
+
+## Quick Reference
+
+| Category | Location | Description |
+|----------|----------|-------------|
+| Data | `scripts/data/` | Data import/export |
+
+## Data Processing (`scripts/data/`) <!-- CUSTOMIZE -->
+
+| Script | Description | Usage |
+|--------|-------------|-------|
+| `scripts/data/import_csv.py` | Import CSV exports into the DB | `import_csv.py <file>` |
+| `scripts/data/dedupe.py` | Remove duplicate customers | `dedupe.py --dry-run` |
+
+## Migration (`scripts/migration/`)
+
+| Script | Description | Usage |
+|--------|-------------|-------|
+| *No scripts yet* | — | — |
+
+## Utilities (`scripts/utils/`)
+
+| Script | Description | Usage |
+|--------|-------------|-------|
+| `scripts/utils/grep_logs.py` | Search logs | `grep_logs.py a\\|b` |
+"""
+
+
+def _catalog_project(tmp_path, monkeypatch):
+    """Write a registry and CATALOG_DOC as SCRIPTS-CATALOG.md under tmp_path."""
+    monkeypatch.setenv("CONTEXT_CACHE_DIR", str(tmp_path / "cache"))
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "context_registry.json").write_text('{"_meta": {}}')
+    (tmp_path / "SCRIPTS-CATALOG.md").write_text(CATALOG_DOC, encoding="utf-8")
+
+
+class TestScriptsCatalog:
+    def test_parse_catalog(self, context_module):
+        rows = context_module.parse_catalog(CATALOG_DOC.splitlines(keepends=True))
+        assert [(r["script"], r["category"]) for r in rows] == [
+            ("scripts/data/import_csv.py", "Data Processing"),
+            ("scripts/data/dedupe.py", "Data Processing"),
+            ("scripts/utils/grep_logs.py", "Utilities"),
+        ]
+        assert rows[0]["description"] == "Import CSV exports into the DB"
+        assert rows[2]["usage"] == "`grep_logs.py a|b`"
+
+    def test_find_scripts(self, context_module, tmp_path, monkeypatch):
+        _catalog_project(tmp_path, monkeypatch)
+        rows = context_module.scripts_index(tmp_path)
+        find = context_module.find_scripts
+        assert [r["script"] for r in find(rows, "CSV")] == ["scripts/data/import_csv.py"]
+        assert [r["script"] for r in find(rows, "data dry-run")] == ["scripts/data/dedupe.py"]
+        assert find(rows, "utilities logs")[0]["category"] == "Utilities"
+        assert find(rows, "nothing") == []
+
+    def test_index_cached_until_catalog_changes(self, context_module, monkeypatch, tmp_path):
+        _catalog_project(tmp_path, monkeypatch)
+        context_module.scripts_index(tmp_path)
+        calls = []
+        real = context_module.parse_catalog
+        monkeypatch.setattr(
+            context_module, "parse_catalog", lambda lines: calls.append(1) or real(lines)
+        )
+        context_module.scripts_index(tmp_path)
+        assert calls == []
+        catalog = tmp_path / "SCRIPTS-CATALOG.md"
+        catalog.write_text(catalog.read_text().replace("Search logs", "Search all logs"))
+        rows = context_module.scripts_index(tmp_path)
+        assert calls == [1]
+        assert rows[2]["description"] == "Search all logs"
+
 
 # ---------------------------------------------------------------------------
 # Integration tests (subprocess)
@@ -265,6 +1505,13 @@ class TestContextCLI:
         assert result.returncode == 0
         assert "World." in result.stdout
 
+    def test_fetch_closes_stdout_then_logs(self, tmp_path):
+        project = self._setup_project(tmp_path)
+        result = self._run("fetch", "greet", cwd=project)
+        assert result.stderr == ""  # no flush errors from the closed stdout at exit
+        log = project / ".git" / "context_cache" / "usage.log"
+        assert json.loads(log.read_text())["key"] == "greet"
+
     def test_no_args_usage(self, tmp_path):
         project = self._setup_project(tmp_path)
         result = self._run(cwd=project)
@@ -276,3 +1523,130 @@ class TestContextCLI:
         result = self._run("bogus", cwd=project)
         assert result.returncode == 1
         assert "Usage" in result.stderr
+
+    def test_suggest_command(self, tmp_path):
+        project = self._setup_project(tmp_path)
+        result = self._run("suggest", "-k", "1", "say hello to the world", cwd=project)
+        assert result.returncode == 0
+        assert result.stdout.split()[1] == "greet"
+
+    def test_sharded_fetch_and_prefix_list(self, tmp_path):
+        project = self._setup_project(tmp_path)
+        shard_dir = project / "docs" / "context_registry.d"
+        shard_dir.mkdir()
+        (shard_dir / "billing.json").write_text(json.dumps({"billing:hello": "hello.md"}))
+        result = self._run("fetch", "billing:hello", cwd=project)
+        assert result.returncode == 0
+        assert "World." in result.stdout
+        result = self._run("list", "billing:", cwd=project)
+        assert result.stdout.split() == ["billing:hello"]
+
+    def test_fetch_records_usage_for_stats(self, tmp_path):
+        project = self._setup_project(tmp_path)
+        for _ in range(2):
+            assert self._run("fetch", "greet", cwd=project).returncode == 0
+        result = self._run("stats", cwd=project)
+        assert result.returncode == 0
+        assert result.stdout.splitlines()[1].split()[:2] == ["greet", "2"]
+
+    def test_fetch_compact_flag(self, tmp_path):
+        project = self._setup_project(tmp_path)
+        (project / "hello.md").write_text("# Hello\n\n\n\nWorld.   \n")
+        result = self._run("fetch", "--compact", "greet", cwd=project)
+        assert result.returncode == 0
+        assert "# Hello\n\nWorld.\n" in result.stdout
+        assert "Compact:" in result.stderr
+
+    def test_fetch_at_rev(self, history_project):
+        result = self._run("fetch", "--rev", "HEAD", "rules", cwd=history_project)
+        assert result.returncode == 0
+        assert "old rule" in result.stdout
+        assert "new rule" not in result.stdout
+        result = self._run("fetch", "rules", cwd=history_project)
+        assert "new rule" in result.stdout
+
+    def test_fetch_format_ndjson(self, tmp_path):
+        self._setup_project(tmp_path)
+        result = self._run("fetch", "--format", "ndjson", "greet", cwd=tmp_path)
+        assert result.returncode == 0
+        record = json.loads(result.stdout)
+        assert record["file"] == "hello.md" and record["text"] == "# Hello\nWorld.\n"
+
+    def test_fetch_format_json_at_rev(self, history_project):
+        result = self._run(
+            "fetch", "--rev", "HEAD", "--format", "json", "rules", cwd=history_project
+        )
+        assert result.returncode == 0
+        doc = json.loads(result.stdout)
+        assert doc["rev"] == "HEAD"
+        assert doc["entries"][0]["text"] == "## Rules\nold rule"
+
+    def test_requirements_for_current_branch(self, tmp_path, monkeypatch):
+        _requirements_project(tmp_path, monkeypatch)
+        _git(tmp_path, "init", "-q", "-b", "feature/20240101-120000-login")
+        result = self._run("requirements", cwd=tmp_path)
+        assert result.returncode == 0
+        assert "- [ ] **Logic:** todo" in result.stdout
+        assert "Acceptance" not in result.stdout
+        assert "Done: 2/3 (1 open)" in result.stdout
+
+    def test_requirements_unknown_branch(self, tmp_path, monkeypatch):
+        _requirements_project(tmp_path, monkeypatch)
+        result = self._run("requirements", "--branch", "chore/none", cwd=tmp_path)
+        assert result.returncode == 1
+        assert "No requirements file" in result.stderr
+
+    def test_progress_archive_and_history(self, tmp_path, monkeypatch):
+        _progress_project(tmp_path, monkeypatch)
+        result = self._run("progress", "archive", cwd=tmp_path)
+        assert result.returncode == 0
+        assert "Archived 3 completed entries" in result.stdout
+        result = self._run("progress", "history", "oauth", cwd=tmp_path)
+        assert result.returncode == 0
+        assert result.stdout.strip().startswith("- [x] **2024-02-10:** Add OAuth login")
+        assert "1 archived entries match: oauth" in result.stderr
+        assert self._run("progress", "bogus", cwd=tmp_path).returncode == 1
+
+    def test_scripts_find(self, tmp_path, monkeypatch):
+        _catalog_project(tmp_path, monkeypatch)
+        result = self._run("scripts", "find", "dedupe", cwd=tmp_path)
+        assert result.returncode == 0
+        lines = result.stdout.splitlines()
+        assert lines[0] == "| Script | Category | Description | Usage |"
+        assert len(lines) == 3
+        assert "`scripts/data/dedupe.py` | Data Processing" in lines[2]
+        result = self._run("scripts", "find", "grep_logs", cwd=tmp_path)
+        assert "a\\|b" in result.stdout  # pipes stay escaped inside cells
+        result = self._run("scripts", "find", "nothing", cwd=tmp_path)
+        assert result.returncode == 1
+        assert "No scripts" in result.stderr
+
+    def test_prefetch_for_branch(self, tmp_path, monkeypatch):
+        _prefetch_project(tmp_path, monkeypatch)
+        result = self._run("prefetch", "--branch", "feature/20240101-120000-x", cwd=tmp_path)
+        assert result.returncode == 0
+        assert "Prefetched 2 keys for feature: 3 entries in 2 files (2 parsed" in result.stdout
+        result = self._run("prefetch", "--branch", "feature/20240101-120000-x", cwd=tmp_path)
+        assert "(0 parsed" in result.stdout
+
+    def test_prefetch_without_key_set(self, tmp_path):
+        self._setup_project(tmp_path)
+        result = self._run("prefetch", "--branch", "feature/x", cwd=tmp_path)
+        assert result.returncode == 0
+        assert "No prefetch keys for branch type 'feature'" in result.stdout
+
+    def test_sizes_budget_check(self, tmp_path, monkeypatch):
+        _sizes_project(tmp_path, monkeypatch)
+        result = self._run("sizes", cwd=tmp_path)
+        assert result.returncode == 0
+        assert "OVERSIZED (> 10 tokens)" in result.stdout
+        result = self._run("sizes", "--check", cwd=tmp_path)
+        assert result.returncode == 1
+        assert "Context budget exceeded: all:" in result.stderr
+        result = self._run("sizes", "--check", "--max-key-tokens", "100", cwd=tmp_path)
+        assert result.returncode == 0
+
+    def test_fetch_unknown_rev(self, history_project):
+        result = self._run("fetch", "--rev", "nope", "rules", cwd=history_project)
+        assert result.returncode == 1
+        assert "Unknown revision" in result.stderr
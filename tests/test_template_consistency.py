@@ -7,6 +7,7 @@ Ensures that the template payload is internally consistent:
 - PROGRESS.md template is generic (no project-specific content)
 - All expected template files exist
 - _meta.protocol_version matches VERSION file
+- _meta.prefetch names only real registry keys
 """
 
 import json
@@ -75,6 +76,14 @@ class TestTemplateConsistency:
                     f"Registry '{key}' section '{value['section']}' not found in {value['file']}"
                 )
 
+    def test_prefetch_keys_exist(self, registry):
+        """Every key in a _meta.prefetch branch-type set should be a registry key."""
+        for branch_type, keys in registry["_meta"].get("prefetch", {}).items():
+            for key in keys:
+                assert key in registry and not key.startswith("_"), (
+                    f"_meta.prefetch['{branch_type}'] names unknown key '{key}'"
+                )
+
     def test_uv_commands_use_uv_run(self):
         """All .md files under templates/ should use `uv run` syntax, not bare `uv <script>`."""
         # Pattern: `uv scripts/` or `uv context.py` etc. without `run` after uv